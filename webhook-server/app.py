@@ -1,32 +1,155 @@
 import os
+import atexit
 import csv
-import json
+import functools
+import hashlib
+import io
 import logging
+import queue
+import struct
+import sys
+import threading
+import time
+import weakref
+from collections import Counter, OrderedDict
+from concurrent.futures import Future, ThreadPoolExecutor
+from contextlib import contextmanager
 from datetime import datetime, timezone
-from html import escape as _esc
-from flask import Flask, request, jsonify, make_response
+from flask import Flask, Response, request, jsonify, stream_with_context
+from flask.json.provider import DefaultJSONProvider
+from flask_compress import Compress
 from flask_cors import CORS
+import orjson
 import psycopg2
-from psycopg2.extras import Json
+import psycopg2.pool
+from psycopg2.extras import execute_values
 import requests as http_requests
+from requests.adapters import HTTPAdapter
+
+
+class OrjsonProvider(DefaultJSONProvider):
+    """Flask JSON provider backed by orjson.
+
+    Dates are passed through to Flask's default handler so responses keep
+    the same HTTP-date format as the stock provider.
+    """
+
+    option = (orjson.OPT_SORT_KEYS | orjson.OPT_NON_STR_KEYS
+              | orjson.OPT_PASSTHROUGH_DATETIME)
+
+    def dumps(self, obj, **kwargs):
+        option = self.option
+        if kwargs.get("indent"):
+            option |= orjson.OPT_INDENT_2
+        return orjson.dumps(obj, default=self.default, option=option).decode()
+
+    def dumpb(self, obj):
+        """Serialize obj straight to UTF-8 bytes."""
+        return orjson.dumps(obj, default=self.default, option=self.option)
+
+    def loads(self, s, **kwargs):
+        return orjson.loads(s)
+
 
 app = Flask(__name__)
+app.json = OrjsonProvider(app)
+app.config.update(
+    COMPRESS_MIMETYPES=["application/json", "text/html", "text/css"],
+    COMPRESS_ALGORITHM=["br", "gzip", "deflate"],
+    COMPRESS_LEVEL=5,
+    COMPRESS_MIN_SIZE=1024,
+)
 CORS(app)
+Compress(app)
 logging.basicConfig(level=logging.INFO)
 logger = logging.getLogger(__name__)
 
 DATABASE_URL = os.environ.get("DATABASE_URL")
 ARCGIS_USERNAME = os.environ.get("ARCGIS_USERNAME")
 ARCGIS_PASSWORD = os.environ.get("ARCGIS_PASSWORD")
+# Schema setup is `flask init-db`'s job (render.yaml runs it before each
+# deploy). Set to 1 to have workers create the tables on first use instead.
+DB_AUTO_INIT = os.environ.get("DB_AUTO_INIT", "0") == "1"
+# Queue /webhook rows for a background writer to insert in groups
+WEBHOOK_GROUP_COMMIT = os.environ.get("WEBHOOK_GROUP_COMMIT") == "1"
+# synchronous_commit for our connections. "off" acknowledges a commit before
+# its WAL is flushed: no fsync wait per webhook, but a server crash can lose
+# the last ~0.5s of acknowledged submissions (it never corrupts data).
+DB_SYNCHRONOUS_COMMIT = os.environ.get("DB_SYNCHRONOUS_COMMIT")
+SYNCHRONOUS_COMMIT_LEVELS = ("on", "off", "local", "remote_write",
+                             "remote_apply")
+# Checked here: a bad value would otherwise fail every connection attempt,
+# and it goes into the libpq options string as-is
+if DB_SYNCHRONOUS_COMMIT and (
+        DB_SYNCHRONOUS_COMMIT not in SYNCHRONOUS_COMMIT_LEVELS):
+    raise RuntimeError(
+        f"DB_SYNCHRONOUS_COMMIT must be one of "
+        f"{', '.join(SYNCHRONOUS_COMMIT_LEVELS)}; "
+        f"got {DB_SYNCHRONOUS_COMMIT!r}")
 ARCGIS_SERVICE_URL = os.environ.get(
     "ARCGIS_SERVICE_URL",
     "https://services5.arcgis.com/pYlVm2T6SvR7ytZv/arcgis/rest/services"
     "/service_36f94509389d4a85a311cc6aa9c7398e_form/FeatureServer/0"
 )
+ARCGIS_BATCH_SIZE = 500
+ARCGIS_MAX_WORKERS = 8
+ARCGIS_TOKEN_TTL = 3600
+ATTACHMENT_CACHE_TTL = 60
+
+# Shared session so ArcGIS calls (including parallel attachment batches)
+# reuse keep-alive TLS connections.
+arcgis_session = http_requests.Session()
+arcgis_session.mount("https://", HTTPAdapter(pool_connections=16,
+                                             pool_maxsize=16))
+
+
+DB_POOL_MAX = 20
+
+
+class _LazyConnectionPool(psycopg2.pool.ThreadedConnectionPool):
+    """ThreadedConnectionPool that connects on demand and keeps what it opens.
+
+    The stock pool opens ``minconn`` connections up front and closes any
+    connection returned beyond that, so bursts reconnect (and re-PREPARE)
+    every time. Here nothing is opened at import and up to ``maxconn``
+    idle connections are kept.
+    """
+
+    def __init__(self, maxconn, *args, **kwargs):
+        super().__init__(0, maxconn, *args, **kwargs)
+        # _putconn only keeps a returned connection while len(pool) < minconn
+        self.minconn = maxconn
+
+
+db_pool = _LazyConnectionPool(
+    DB_POOL_MAX, dsn=DATABASE_URL,
+    **({"options": f"-c synchronous_commit={DB_SYNCHRONOUS_COMMIT}"}
+       if DB_SYNCHRONOUS_COMMIT else {})
+)
+atexit.register(db_pool.closeall)
+# A worker serves more concurrent requests than it has connections, so
+# callers wait here for a free one instead of getting PoolError.
+_db_slots = threading.BoundedSemaphore(DB_POOL_MAX)
 
 
+@contextmanager
 def get_db():
-    return psycopg2.connect(DATABASE_URL)
+    """Check a connection out of the pool for the duration of a block.
+
+    Commits on success and rolls back on error, like ``with conn:``, then
+    returns the connection to the pool (closing it if it was broken).
+    """
+    with _db_slots:
+        conn = db_pool.getconn()
+        try:
+            yield conn
+            conn.commit()
+        except Exception:
+            if not conn.closed:
+                conn.rollback()
+            raise
+        finally:
+            db_pool.putconn(conn, close=bool(conn.closed))
 
 
 def init_db():
@@ -58,11 +181,209 @@ def init_db():
                     ON survey_submissions(agent_name);
                 CREATE INDEX IF NOT EXISTS idx_submissions_submitted
                     ON survey_submissions(submitted_at);
+
+                CREATE TABLE IF NOT EXISTS report_counters (
+                    field TEXT,
+                    bucket TEXT,
+                    count BIGINT NOT NULL,
+                    PRIMARY KEY (field, bucket)
+                );
+                -- Submissions not yet folded into report_counters
+                CREATE TABLE IF NOT EXISTS report_pending (
+                    id INTEGER PRIMARY KEY
+                );
+                -- _report_keys_hash() of the keys report_counters was
+                -- built for
+                CREATE TABLE IF NOT EXISTS report_counters_meta (
+                    keys_hash TEXT NOT NULL
+                );
+
+                CREATE OR REPLACE FUNCTION queue_report_pending()
+                    RETURNS trigger LANGUAGE plpgsql AS $$
+                BEGIN
+                    INSERT INTO report_pending (id) SELECT id FROM new_rows;
+                    RETURN NULL;
+                END
+                $$;
             """)
+            if not _report_counters_current(cur):
+                _rebuild_report_counters(cur)
         conn.commit()
     logger.info("Database initialized")
 
 
+def build_indexes():
+    """Build the extra indexes (and switch raw_payload to lz4).
+
+    Indexes are built CONCURRENTLY so webhook INSERTs carry on meanwhile, but
+    on a large table that still takes a while, so this runs from
+    ``flask init-db`` at deploy time rather than on a worker's first request.
+    A concurrent build that failed part way leaves an INVALID index, which
+    IF NOT EXISTS would skip from then on; those are dropped and rebuilt.
+    """
+    indexes = {
+        # Serves /submissions' newest-first ORDER BY ... LIMIT and the
+        # MAX() in _db_fingerprint
+        "idx_submissions_received": "(received_at)",
+    }
+    with get_db() as conn:
+        # CONCURRENTLY can't run inside a transaction block
+        conn.autocommit = True
+        try:
+            with conn.cursor() as cur:
+                cur.execute("""
+                    SELECT c.relname
+                    FROM pg_index AS i
+                    JOIN pg_class AS c ON c.oid = i.indexrelid
+                    WHERE i.indrelid = 'survey_submissions'::regclass
+                      AND NOT i.indisvalid AND c.relname = ANY(%s)
+                """, (list(indexes),))
+                for (name,) in cur.fetchall():
+                    logger.warning("Rebuilding invalid index %s", name)
+                    cur.execute(f"DROP INDEX CONCURRENTLY IF EXISTS {name}")
+                for name in DROPPED_INDEXES:
+                    cur.execute(f"DROP INDEX CONCURRENTLY IF EXISTS {name}")
+                for name, spec in indexes.items():
+                    cur.execute(f"""
+                        CREATE INDEX CONCURRENTLY IF NOT EXISTS {name}
+                            ON survey_submissions {spec}
+                    """)
+                _use_lz4_for_raw_payload(conn, cur)
+        finally:
+            conn.autocommit = False
+    logger.info("Indexes built")
+
+
+def _use_lz4_for_raw_payload(conn, cur):
+    """Switch raw_payload's TOAST compression from pglz to lz4 (PG 14+).
+
+    lz4 decompresses several times faster, which is what reading a large,
+    TOASTed payload costs. Only values written afterwards are affected.
+    """
+    if conn.server_version < 140000:
+        return
+    cur.execute("""
+        SELECT attcompression FROM pg_attribute
+        WHERE attrelid = 'survey_submissions'::regclass
+          AND attname = 'raw_payload'
+    """)
+    if cur.fetchone()[0] == "l":
+        return
+    try:
+        cur.execute("""
+            ALTER TABLE survey_submissions
+                ALTER COLUMN raw_payload SET COMPRESSION lz4
+        """)
+    except psycopg2.Error as e:
+        # Servers built without lz4 keep pglz
+        logger.warning("Could not enable lz4 for raw_payload: %s", e)
+
+
+_db_initialized = False
+_db_init_lock = threading.Lock()
+
+
+def _ensure_db():
+    """Run init_db() once per process, on first use instead of at import.
+
+    Workers then boot without waiting on Postgres, and the DDL only runs
+    in processes that actually serve a request. The slower build_indexes()
+    is left to ``flask init-db``.
+    """
+    global _db_initialized
+    if not _db_initialized:
+        with _db_init_lock:
+            if not _db_initialized:
+                init_db()
+                _db_initialized = True
+
+
+@app.before_request
+def _init_db_on_first_request():
+    # The readiness probe reports DB problems itself, as a 503
+    if DB_AUTO_INIT and request.endpoint != "readiness":
+        try:
+            _ensure_db()
+        except Exception as e:
+            # Retried on the next request. Meanwhile the view runs anyway:
+            # routes that need no DB still work, and the rest fail with
+            # their own error responses (or /report's stale fallback).
+            logger.error("Database init failed: %s", e)
+
+
+# Indexes earlier versions built that no query uses any more; they only
+# slowed every INSERT. build_indexes() drops them from deployed databases.
+DROPPED_INDEXES = (
+    "idx_attr_category", "idx_attr_company_status", "idx_attr_working_days",
+    "idx_attr_agent_name", "idx_attr_secondary_category",
+    "idx_sub_submitted_brin",
+)
+
+
+# Server-side prepared statements, created lazily per connection and run
+# with EXECUTE so Postgres skips parse/plan on repeated calls.
+PREPARED_STATEMENTS = {
+    # Survey123 re-sends a webhook it got no answer for. A payload identical
+    # to a stored one for the same global_id returns that row's id (and
+    # FALSE) instead of inserting it again; edits differ in payload.
+    "ins_sub": """
+        WITH existing AS (
+            SELECT id FROM survey_submissions
+            WHERE global_id = $2 AND raw_payload = $13::jsonb
+            LIMIT 1
+        ), inserted AS (
+            INSERT INTO survey_submissions
+                (object_id, global_id, event_type, agent_name, agent_id,
+                 poi_name_ar, poi_name_en, category, subcategory,
+                 latitude, longitude, submitted_at,
+                 raw_payload, attributes)
+            SELECT $1::integer, $2, $3, $4, $5, $6, $7, $8, $9,
+                   $10::float8, $11::float8, $12::timestamptz, $13::jsonb,
+                   COALESCE($13::jsonb -> 'feature' -> 'attributes', '{}')
+            WHERE NOT EXISTS (SELECT 1 FROM existing)
+            RETURNING id
+        )
+        SELECT id, TRUE FROM inserted
+        UNION ALL
+        SELECT id, FALSE FROM existing
+    """,
+    # raw_payload is left to get_raw: it is the largest (TOASTed) column
+    # and mostly duplicates attributes
+    "get_sub": """
+        SELECT id, object_id, global_id, event_type,
+               agent_name, agent_id, poi_name_ar, poi_name_en,
+               category, subcategory, latitude, longitude,
+               submitted_at, received_at, attributes
+        FROM survey_submissions WHERE id = $1
+    """,
+    # ::text hands the stored JSON through without a parse/re-encode
+    "get_raw": """
+        SELECT raw_payload::text FROM survey_submissions WHERE id = $1
+    """,
+}
+PREPARED_CACHE_SIZE = 256
+
+# connection -> OrderedDict of prepared statement names (LRU order)
+_prepared = weakref.WeakKeyDictionary()
+
+
+def _execute_prepared(cur, name, params):
+    """EXECUTE a statement from PREPARED_STATEMENTS, preparing it on first use."""
+    prepared = _prepared.get(cur.connection)
+    if prepared is None:
+        prepared = _prepared[cur.connection] = OrderedDict()
+    if name in prepared:
+        prepared.move_to_end(name)
+    else:
+        if len(prepared) >= PREPARED_CACHE_SIZE:
+            oldest, _ = prepared.popitem(last=False)
+            cur.execute(f"DEALLOCATE {oldest}")
+        cur.execute(f"PREPARE {name} AS {PREPARED_STATEMENTS[name]}")
+        prepared[name] = True
+    placeholders = ", ".join(["%s"] * len(params))
+    cur.execute(f"EXECUTE {name} ({placeholders})", params)
+
+
 @app.route("/", methods=["GET"])
 def health():
     return jsonify({
@@ -72,73 +393,314 @@ def health():
     })
 
 
-@app.route("/webhook", methods=["POST", "OPTIONS"])
-def webhook():
+@app.route("/health", methods=["GET"])
+def readiness():
+    """Readiness probe: 200 only while Postgres answers."""
     try:
-        payload = request.get_json(force=True)
-        logger.info("Webhook received: %s", json.dumps(payload, default=str)[:500])
-
-        event_type = payload.get("eventType", "unknown")
-
-        # Extract feature data
-        feature = payload.get("feature", {})
-        attrs = feature.get("attributes", {})
-        geometry = feature.get("geometry", {})
-
-        # Extract server response
-        server_resp = payload.get("serverResponse", {})
-        object_id = server_resp.get("objectId")
-        global_id = server_resp.get("globalId")
-
-        # Extract key fields from attributes
-        agent_name = attrs.get("agent_name", "")
-        agent_id = attrs.get("agent_id", "")
-        poi_name_ar = attrs.get("name_ar", "")
-        poi_name_en = attrs.get("name_en", "")
-        category = attrs.get("category", "")
-        subcategory = attrs.get("secondary_category", "")
-        latitude = geometry.get("y") or attrs.get("latitude")
-        longitude = geometry.get("x") or attrs.get("longitude")
-
-        # Parse submission time
-        survey_datetime = attrs.get("survey_datetime")
-        submitted_at = None
-        if survey_datetime:
-            try:
-                if isinstance(survey_datetime, (int, float)):
-                    submitted_at = datetime.fromtimestamp(
-                        survey_datetime / 1000, tz=timezone.utc
-                    )
-                else:
-                    submitted_at = datetime.fromisoformat(str(survey_datetime))
-            except (ValueError, OSError):
-                submitted_at = datetime.now(timezone.utc)
-        else:
-            submitted_at = datetime.now(timezone.utc)
+        with get_db() as conn:
+            with conn.cursor() as cur:
+                cur.execute("SELECT 1")
+        return jsonify({"status": "ok"}), 200
+    except Exception as e:
+        return jsonify({"status": "error", "message": str(e)}), 503
 
+
+def _payload_error(payload):
+    """Return why a webhook payload can't be stored, or None if it can.
+
+    Only what _submission_values() reads is checked: the containers and the
+    scalars bound for typed columns. Bad input gets a 400 before any DB work
+    instead of an AttributeError or Postgres 500.
+    """
+    if not isinstance(payload, dict):
+        return "Payload must be a JSON object"
+    feature = payload.get("feature", {})
+    if not isinstance(feature, dict):
+        return "feature must be an object"
+    for key in ("attributes", "geometry"):
+        if not isinstance(feature.get(key, {}), dict):
+            return f"feature.{key} must be an object"
+    server_resp = payload.get("serverResponse", {})
+    if not isinstance(server_resp, dict):
+        return "serverResponse must be an object"
+
+    # Scalars have to fit their columns, or the INSERT fails with a 500
+    # (and takes a whole batch or write group down with it)
+    object_id = server_resp.get("objectId")
+    if object_id is not None and (
+            not isinstance(object_id, int) or isinstance(object_id, bool)
+            or not -2**31 <= object_id < 2**31):
+        return "serverResponse.objectId must be a 32-bit integer"
+    if not isinstance(server_resp.get("globalId"), (str, type(None))):
+        return "serverResponse.globalId must be a string"
+    if not isinstance(payload.get("eventType", ""), (str, type(None))):
+        return "eventType must be a string"
+    attrs = feature.get("attributes", {})
+    for key in SUBMISSION_TEXT_ATTRIBUTES:
+        val = attrs.get(key)
+        if val is not None and (isinstance(val, bool)
+                                or not isinstance(val, (str, int, float))):
+            return f"feature.attributes.{key} must be a string"
+    geometry = feature.get("geometry", {})
+    for axis, key in (("y", "latitude"), ("x", "longitude")):
+        val = geometry.get(axis) or attrs.get(key)
+        if val is not None and not _is_number(val):
+            return (f"feature.geometry.{axis} / attributes.{key} "
+                    f"must be a number")
+    return None
+
+
+def _is_number(value):
+    """True for a JSON number, or a string Postgres can read as float8."""
+    if isinstance(value, bool):
+        return False
+    if isinstance(value, (int, float)):
+        return True
+    if isinstance(value, str):
+        try:
+            float(value)
+        except ValueError:
+            return False
+        return True
+    return False
+
+
+def _parse_survey_datetime(value):
+    """Parse survey_datetime, falling back to now if it is missing or bad.
+
+    Survey123 usually sends epoch milliseconds, so that is checked first;
+    anything else is read as an ISO 8601 string.
+    """
+    if not value:
+        return datetime.now(timezone.utc)
+    try:
+        if isinstance(value, (int, float)):
+            return datetime.fromtimestamp(value / 1000, tz=timezone.utc)
+        return datetime.fromisoformat(str(value))
+    except (ValueError, OverflowError, OSError):
+        return datetime.now(timezone.utc)
+
+
+# Attributes copied into ins_sub's text columns
+SUBMISSION_TEXT_ATTRIBUTES = ("agent_name", "agent_id", "name_ar", "name_en",
+                              "category", "secondary_category")
+
+
+def _text(value):
+    """Pass strings and None through; store numbers as their text."""
+    return value if value is None or isinstance(value, str) else str(value)
+
+
+def _submission_values(payload, raw_json):
+    """Map a Survey123 webhook payload to ins_sub's parameter tuple.
+
+    ``raw_json`` is the payload already serialized for raw_payload; the
+    attributes column is extracted from it by Postgres, not sent again.
+    """
+    event_type = payload.get("eventType", "unknown")
+
+    # Extract feature data
+    feature = payload.get("feature", {})
+    attrs = feature.get("attributes", {})
+    geometry = feature.get("geometry", {})
+
+    # Extract server response
+    server_resp = payload.get("serverResponse", {})
+    object_id = server_resp.get("objectId")
+    global_id = server_resp.get("globalId")
+
+    # Extract key fields from attributes
+    agent_name = _text(attrs.get("agent_name", ""))
+    agent_id = _text(attrs.get("agent_id", ""))
+    poi_name_ar = _text(attrs.get("name_ar", ""))
+    poi_name_en = _text(attrs.get("name_en", ""))
+    category = _text(attrs.get("category", ""))
+    subcategory = _text(attrs.get("secondary_category", ""))
+    latitude = geometry.get("y") or attrs.get("latitude")
+    longitude = geometry.get("x") or attrs.get("longitude")
+
+    submitted_at = _parse_survey_datetime(attrs.get("survey_datetime"))
+
+    return (
+        object_id, global_id, event_type,
+        agent_name, agent_id,
+        poi_name_ar, poi_name_en,
+        category, subcategory,
+        latitude, longitude, submitted_at,
+        raw_json
+    )
+
+
+WEBHOOK_BATCH_PAGE_SIZE = 500
+# (id, *_submission_values()) rows. Casts give the VALUES list the table's
+# column types (a page of all-NULL object_ids would otherwise be typed text).
+WEBHOOK_BATCH_TEMPLATE = (
+    "(%s::integer, %s::integer, %s, %s, %s, %s, %s, %s, %s, %s,"
+    " %s::float8, %s::float8, %s::timestamptz, %s::jsonb)"
+)
+
+
+def _insert_submissions(cur, values):
+    """Insert _submission_values() tuples as multi-row INSERTs.
+
+    Exact retries (same global_id and payload as a stored row, or as an
+    earlier row in ``values``) are not inserted again, as with ins_sub.
+    Returns ``(ids, new_ids)``: the id of every input row in order, and the
+    ids actually inserted.
+    """
+    ids = [None] * len(values)
+    # (global_id, raw_payload) -> index of its first row in values
+    first = {}
+    for i, row in enumerate(values):
+        if row[1] is not None:
+            first.setdefault((row[1], row[12]), i)
+    if first:
+        keys = list(first)
+        cur.execute("""
+            SELECT q.i, s.id
+            FROM unnest(%s::text[], %s::jsonb[], %s::int[])
+                AS q (global_id, raw_payload, i)
+            JOIN survey_submissions AS s
+              ON s.global_id = q.global_id AND s.raw_payload = q.raw_payload
+        """, ([k[0] for k in keys], [k[1] for k in keys],
+              [first[k] for k in keys]))
+        for i, row_id in cur:
+            ids[i] = row_id
+    fresh = [i for i, row in enumerate(values)
+             if ids[i] is None
+             and (row[1] is None or first[row[1], row[12]] == i)]
+    new_ids = []
+    if fresh:
+        # The ids are drawn up front and inserted explicitly: RETURNING
+        # order isn't guaranteed to follow the VALUES list.
+        cur.execute("""
+            SELECT nextval(pg_get_serial_sequence('survey_submissions', 'id'))
+            FROM generate_series(1, %s)
+        """, (len(fresh),))
+        new_ids = [row[0] for row in cur]
+        for i, row_id in zip(fresh, new_ids):
+            ids[i] = row_id
+        execute_values(cur, """
+            INSERT INTO survey_submissions
+                (id, object_id, global_id, event_type, agent_name,
+                 agent_id, poi_name_ar, poi_name_en, category,
+                 subcategory, latitude, longitude, submitted_at,
+                 raw_payload, attributes)
+            SELECT v.*,
+                   COALESCE(v.raw_payload -> 'feature' -> 'attributes', '{}')
+            FROM (VALUES %s) AS v
+                (id, object_id, global_id, event_type, agent_name,
+                 agent_id, poi_name_ar, poi_name_en, category,
+                 subcategory, latitude, longitude, submitted_at,
+                 raw_payload)
+        """, [(ids[i], *values[i]) for i in fresh],
+           template=WEBHOOK_BATCH_TEMPLATE, page_size=WEBHOOK_BATCH_PAGE_SIZE)
+    # Repeats within values share their first row's id
+    for i, row in enumerate(values):
+        if ids[i] is None:
+            ids[i] = ids[first[row[1], row[12]]]
+    return ids, new_ids
+
+
+# (values, Future) pairs waiting for the group-commit writer
+_webhook_queue = queue.Queue()
+_webhook_writer = None
+_webhook_writer_lock = threading.Lock()
+
+
+def _write_webhook_group(group):
+    """Insert a group of queued rows in one transaction and resolve them."""
+    global _data_version
+    try:
         with get_db() as conn:
             with conn.cursor() as cur:
-                cur.execute("""
-                    INSERT INTO survey_submissions
-                        (object_id, global_id, event_type, agent_name, agent_id,
-                         poi_name_ar, poi_name_en, category, subcategory,
-                         latitude, longitude, submitted_at,
-                         raw_payload, attributes)
-                    VALUES (%s, %s, %s, %s, %s, %s, %s, %s, %s, %s, %s, %s, %s, %s)
-                    RETURNING id
-                """, (
-                    object_id, global_id, event_type,
-                    agent_name, agent_id,
-                    poi_name_ar, poi_name_en,
-                    category, subcategory,
-                    latitude, longitude, submitted_at,
-                    Json(payload), Json(attrs)
-                ))
-                row_id = cur.fetchone()[0]
-            conn.commit()
+                ids, new_ids = _insert_submissions(
+                    cur, [values for values, _ in group])
+    except Exception as e:
+        if len(group) == 1:
+            group[0][1].set_exception(e)
+            return
+        # Retry one by one so a single bad row only fails its own webhook
+        for item in group:
+            _write_webhook_group([item])
+        return
+    if new_ids:
+        _data_version += 1
+    # A repeat later in the group shares its first row's id but was not
+    # the one inserted; discard() leaves only that first row True.
+    new_ids = set(new_ids)
+    for (_, future), row_id in zip(group, ids):
+        future.set_result((row_id, row_id in new_ids))
+        new_ids.discard(row_id)
+
+
+def _webhook_writer_loop():
+    while True:
+        group = [_webhook_queue.get()]
+        # Take whatever else queued up meanwhile; an idle server still
+        # writes each webhook straight away.
+        while len(group) < WEBHOOK_BATCH_PAGE_SIZE:
+            try:
+                group.append(_webhook_queue.get_nowait())
+            except queue.Empty:
+                break
+        _write_webhook_group(group)
+
+
+def _queue_submission(values):
+    """Queue a row for the group-commit writer.
 
+    Returns a Future of ``(id, inserted)``, like ins_sub's result row.
+    """
+    global _webhook_writer
+    if _webhook_writer is None:
+        # Started lazily so each gunicorn worker gets its own writer
+        with _webhook_writer_lock:
+            if _webhook_writer is None:
+                _webhook_writer = threading.Thread(
+                    target=_webhook_writer_loop, name="webhook-writer",
+                    daemon=True)
+                _webhook_writer.start()
+    future = Future()
+    _webhook_queue.put((values, future))
+    return future
+
+
+@app.route("/webhook", methods=["POST", "OPTIONS"])
+def webhook():
+    global _data_version
+    try:
+        # silent: a body that isn't JSON is a 400 below, not a 500
+        payload = request.get_json(force=True, silent=True)
+        error = ("Request body must be valid JSON" if payload is None
+                 else _payload_error(payload))
+        if error:
+            return jsonify({"status": "error", "message": error}), 400
+        # Serialized once: used for the log preview and the raw_payload JSONB
+        raw_json = orjson.dumps(payload).decode()
+        logger.info("Webhook received: %.500s", raw_json)
+
+        values = _submission_values(payload, raw_json)
+        if WEBHOOK_GROUP_COMMIT:
+            # Concurrent webhooks share one INSERT and commit; this still
+            # waits for the row's own id.
+            row_id, inserted = _queue_submission(values).result()
+        else:
+            with get_db() as conn:
+                with conn.cursor() as cur:
+                    # get_db() commits on exit; all the JSON work is done
+                    # above, so the transaction spans just this statement.
+                    _execute_prepared(cur, "ins_sub", values)
+                    row_id, inserted = cur.fetchone()
+            if inserted:
+                _data_version += 1
+
+        if not inserted:
+            logger.info("Duplicate of submission #%d, not stored again",
+                        row_id)
+            return jsonify({"status": "success", "id": row_id}), 200
         logger.info("Saved submission #%d (agent=%s, poi=%s)",
-                     row_id, agent_name, poi_name_ar)
+                     row_id, values[3], values[5])
 
         return jsonify({"status": "success", "id": row_id}), 200
 
@@ -147,26 +709,98 @@ def webhook():
         return jsonify({"status": "error", "message": str(e)}), 500
 
 
+@app.route("/webhook/batch", methods=["POST"])
+def webhook_batch():
+    """Store a JSON array of webhook payloads (e.g. a replay) in one go.
+
+    Rows go out as multi-row INSERTs of WEBHOOK_BATCH_PAGE_SIZE each via
+    execute_values, instead of one round trip per submission.
+    """
+    global _data_version
+    try:
+        payloads = request.get_json(force=True, silent=True)
+        if payloads is None:
+            return jsonify({"status": "error",
+                            "message": "Request body must be valid JSON"}), 400
+        if not isinstance(payloads, list):
+            return jsonify({"status": "error",
+                            "message": "Expected a JSON array of payloads"}), 400
+        for i, payload in enumerate(payloads):
+            error = _payload_error(payload)
+            if error:
+                return jsonify({"status": "error",
+                                "message": f"payloads[{i}]: {error}"}), 400
+        logger.info("Webhook batch received: %d payloads", len(payloads))
+
+        values = [_submission_values(p, orjson.dumps(p).decode())
+                  for p in payloads]
+        with get_db() as conn:
+            with conn.cursor() as cur:
+                ids, new_ids = _insert_submissions(cur, values)
+
+        if new_ids:
+            _data_version += 1
+        logger.info("Saved %d submissions from batch (%d duplicates)",
+                    len(new_ids), len(ids) - len(new_ids))
+
+        return jsonify({"status": "success", "ids": ids,
+                        "count": len(ids), "inserted": len(new_ids)}), 200
+
+    except Exception as e:
+        logger.error("Webhook batch error: %s", str(e), exc_info=True)
+        return jsonify({"status": "error", "message": str(e)}), 500
+
+
+SUBMISSIONS_STREAM_CHUNK = 500
+
+
+def _stream_submissions(limit):
+    """Yield the /submissions JSON body in chunks from a server-side cursor.
+
+    The first chunk is yielded only after the query has run, so callers can
+    prime the generator to surface DB errors before streaming starts.
+    """
+    with get_db() as conn:
+        with conn.cursor(name="list_sub_stream") as cur:
+            cur.itersize = SUBMISSIONS_STREAM_CHUNK
+            cur.execute("""
+                SELECT id, object_id, global_id, event_type,
+                       agent_name, poi_name_ar, poi_name_en,
+                       category, subcategory,
+                       latitude, longitude,
+                       submitted_at, received_at
+                FROM survey_submissions
+                ORDER BY received_at DESC
+                LIMIT %s
+            """, (limit,))
+            rows = cur.fetchmany(SUBMISSIONS_STREAM_CHUNK)
+            yield b'{"submissions":['
+            columns = [desc[0] for desc in cur.description]
+            dumpb = app.json.dumpb
+            count = 0
+            while rows:
+                chunk = b",".join(dumpb(dict(zip(columns, row)))
+                                  for row in rows)
+                yield chunk if not count else b"," + chunk
+                count += len(rows)
+                rows = cur.fetchmany(SUBMISSIONS_STREAM_CHUNK)
+            yield b'],"count":%d}' % count
+
+
 @app.route("/submissions", methods=["GET"])
 def list_submissions():
     try:
         limit = request.args.get("limit", 50, type=int)
-        with get_db() as conn:
-            with conn.cursor() as cur:
-                cur.execute("""
-                    SELECT id, object_id, global_id, event_type,
-                           agent_name, poi_name_ar, poi_name_en,
-                           category, subcategory,
-                           latitude, longitude,
-                           submitted_at, received_at
-                    FROM survey_submissions
-                    ORDER BY received_at DESC
-                    LIMIT %s
-                """, (limit,))
-                columns = [desc[0] for desc in cur.description]
-                rows = [dict(zip(columns, row)) for row in cur.fetchall()]
+        chunks = _stream_submissions(limit)
+        first = next(chunks)
+
+        def body():
+            yield first
+            yield from chunks
 
-        return jsonify({"count": len(rows), "submissions": rows}), 200
+        resp = Response(body(), mimetype="application/json")
+        resp.call_on_close(chunks.close)
+        return resp
 
     except Exception as e:
         return jsonify({"status": "error", "message": str(e)}), 500
@@ -177,9 +811,7 @@ def get_submission(sub_id):
     try:
         with get_db() as conn:
             with conn.cursor() as cur:
-                cur.execute("""
-                    SELECT * FROM survey_submissions WHERE id = %s
-                """, (sub_id,))
+                _execute_prepared(cur, "get_sub", (sub_id,))
                 columns = [desc[0] for desc in cur.description]
                 row = cur.fetchone()
                 if not row:
@@ -192,33 +824,133 @@ def get_submission(sub_id):
         return jsonify({"status": "error", "message": str(e)}), 500
 
 
+@app.route("/submissions/<int:sub_id>/raw", methods=["GET"])
+def get_submission_raw(sub_id):
+    """Return a submission's original webhook payload as stored."""
+    try:
+        with get_db() as conn:
+            with conn.cursor() as cur:
+                _execute_prepared(cur, "get_raw", (sub_id,))
+                row = cur.fetchone()
+        # CSV-imported rows have no raw payload
+        if not row or row[0] is None:
+            return jsonify({"error": "Not found"}), 404
+        return Response(row[0], mimetype="application/json")
+
+    except Exception as e:
+        return jsonify({"status": "error", "message": str(e)}), 500
+
+
+_token_cache = {"token": None, "exp": 0.0}
+_token_lock = threading.Lock()
+
+# Bumped by /webhook so cached ArcGIS summaries are refreshed after a new
+# submission instead of waiting for the TTL.
+_data_version = 0
+
+
+def _ttl_cache(ttl):
+    """Cache a no-argument function's result for ``ttl`` seconds.
+
+    The cached value is also dropped when ``_data_version`` changes. One
+    caller refreshes while concurrent ones wait for its result.
+    """
+    def decorator(func):
+        entry = {"version": None, "exp": 0.0, "value": None}
+        lock = threading.Lock()
+
+        def fresh():
+            return (entry["version"] == _data_version
+                    and time.monotonic() < entry["exp"])
+
+        @functools.wraps(func)
+        def wrapper():
+            if fresh():
+                return entry["value"]
+            with lock:
+                if fresh():
+                    return entry["value"]
+                version = _data_version
+                now = time.monotonic()
+                value = func()
+                entry.update(version=version, exp=now + ttl, value=value)
+                return value
+        return wrapper
+    return decorator
+
+
 def _get_arcgis_token():
-    """Get an ArcGIS Online token using stored credentials."""
+    """Get an ArcGIS Online token using stored credentials.
+
+    Tokens are reused until a minute before they expire; one caller
+    refreshes while concurrent ones wait for its result.
+    """
+    if time.time() < _token_cache["exp"] - 60:
+        return _token_cache["token"]
     if not ARCGIS_USERNAME or not ARCGIS_PASSWORD:
         logger.warning("ArcGIS credentials not set: username=%s, password=%s",
                         bool(ARCGIS_USERNAME), bool(ARCGIS_PASSWORD))
         return None
-    try:
-        r = http_requests.post(
-            "https://www.arcgis.com/sharing/rest/generateToken",
+    with _token_lock:
+        if time.time() < _token_cache["exp"] - 60:
+            return _token_cache["token"]
+        try:
+            r = arcgis_session.post(
+                "https://www.arcgis.com/sharing/rest/generateToken",
+                data={
+                    "username": ARCGIS_USERNAME,
+                    "password": ARCGIS_PASSWORD,
+                    "referer": "https://www.arcgis.com",
+                    "expiration": ARCGIS_TOKEN_TTL // 60,
+                    "f": "json",
+                },
+                timeout=15,
+            )
+            data = orjson.loads(r.content)
+            token = data.get("token")
+            if not token:
+                logger.warning("ArcGIS token response (no token): %s",
+                               orjson.dumps(data).decode())
+            else:
+                # "expires" is epoch milliseconds; the server may cap the
+                # expiration we asked for.
+                expires = data.get("expires")
+                exp = (expires / 1000 if expires
+                       else time.time() + ARCGIS_TOKEN_TTL)
+                _token_cache.update(token=token, exp=exp)
+            return token
+        except Exception as e:
+            logger.warning("Failed to get ArcGIS token: %s", e)
+            return None
+
+
+def _query_attachment_batches(object_ids, token):
+    """Run queryAttachments for object_ids in parallel batches.
+
+    Returns the decoded JSON responses in batch order.
+    """
+    batches = [object_ids[i:i + ARCGIS_BATCH_SIZE]
+               for i in range(0, len(object_ids), ARCGIS_BATCH_SIZE)]
+
+    # POST keeps large objectIds lists out of the URL length limit
+    def fetch(batch):
+        r = arcgis_session.post(
+            f"{ARCGIS_SERVICE_URL}/queryAttachments",
             data={
-                "username": ARCGIS_USERNAME,
-                "password": ARCGIS_PASSWORD,
-                "referer": "https://www.arcgis.com",
+                "objectIds": ",".join(str(oid) for oid in batch),
                 "f": "json",
+                "token": token,
             },
-            timeout=15,
+            timeout=30,
         )
-        data = r.json()
-        token = data.get("token")
-        if not token:
-            logger.warning("ArcGIS token response (no token): %s", json.dumps(data))
-        return token
-    except Exception as e:
-        logger.warning("Failed to get ArcGIS token: %s", e)
-        return None
+        return orjson.loads(r.content)
 
+    workers = min(ARCGIS_MAX_WORKERS, len(batches)) or 1
+    with ThreadPoolExecutor(max_workers=workers) as executor:
+        return list(executor.map(fetch, batches))
 
+
+@_ttl_cache(ATTACHMENT_CACHE_TTL)
 def _get_attachment_counts():
     """Query ArcGIS feature service for photo and video attachment counts.
 
@@ -231,7 +963,7 @@ def _get_attachment_counts():
 
     try:
         # Get object IDs for actual survey submissions (not pre-loaded POIs)
-        r = http_requests.get(
+        r = arcgis_session.get(
             f"{ARCGIS_SERVICE_URL}/query",
             params={
                 "where": "agent_name IS NOT NULL AND agent_name <> ''",
@@ -241,30 +973,15 @@ def _get_attachment_counts():
             },
             timeout=30,
         )
-        oid_data = r.json()
+        oid_data = orjson.loads(r.content)
         object_ids = oid_data.get("objectIds", [])
         if not object_ids:
             return 0, 0
 
         total_photos = 0
         total_videos = 0
-        batch_size = 100
-
-        for i in range(0, len(object_ids), batch_size):
-            batch_ids = object_ids[i : i + batch_size]
-            ids_str = ",".join(str(oid) for oid in batch_ids)
-
-            r = http_requests.get(
-                f"{ARCGIS_SERVICE_URL}/queryAttachments",
-                params={
-                    "objectIds": ids_str,
-                    "f": "json",
-                    "token": token,
-                },
-                timeout=30,
-            )
-            att_data = r.json()
 
+        for att_data in _query_attachment_batches(object_ids, token):
             if "error" in att_data:
                 logger.warning("ArcGIS attachment query error: %s",
                                att_data["error"])
@@ -272,10 +989,11 @@ def _get_attachment_counts():
 
             for group in att_data.get("attachmentGroups", []):
                 for att in group.get("attachmentInfos", []):
-                    content_type = (att.get("contentType") or "").lower()
-                    if content_type.startswith("image/"):
+                    # Only the 6-char MIME prefix is case-normalized
+                    prefix = (att.get("contentType") or "")[:6].lower()
+                    if prefix == "image/":
                         total_photos += 1
-                    elif content_type.startswith("video/"):
+                    elif prefix == "video/":
                         total_videos += 1
 
         return total_photos, total_videos
@@ -285,6 +1003,7 @@ def _get_attachment_counts():
         return None, None
 
 
+@_ttl_cache(ATTACHMENT_CACHE_TTL)
 def _get_attachment_details():
     """Get detailed attachment info including per-keyword breakdown."""
     token = _get_arcgis_token()
@@ -294,7 +1013,7 @@ def _get_attachment_details():
     if not token:
         return result
     try:
-        r = http_requests.get(
+        r = arcgis_session.get(
             f"{ARCGIS_SERVICE_URL}/query",
             params={
                 "where": "agent_name IS NOT NULL AND agent_name <> ''",
@@ -304,31 +1023,23 @@ def _get_attachment_details():
             },
             timeout=30,
         )
-        object_ids = r.json().get("objectIds", [])
+        object_ids = orjson.loads(r.content).get("objectIds", [])
         if not object_ids:
             return result
         result["total_pois_queried"] = len(object_ids)
-        for i in range(0, len(object_ids), 100):
-            batch = object_ids[i:i + 100]
-            r2 = http_requests.get(
-                f"{ARCGIS_SERVICE_URL}/queryAttachments",
-                params={"objectIds": ",".join(str(o) for o in batch),
-                        "f": "json", "token": token},
-                timeout=30,
-            )
-            data = r2.json()
+        for data in _query_attachment_batches(object_ids, token):
             if "error" in data:
                 break
             for group in data.get("attachmentGroups", []):
                 has_photo = has_video = False
                 for att in group.get("attachmentInfos", []):
-                    ct = (att.get("contentType") or "").lower()
+                    prefix = (att.get("contentType") or "")[:6].lower()
                     kw = att.get("keywords") or "other"
                     result["by_keyword"][kw] = result["by_keyword"].get(kw, 0) + 1
-                    if ct.startswith("image/"):
+                    if prefix == "image/":
                         result["total_photos"] += 1
                         has_photo = True
-                    elif ct.startswith("video/"):
+                    elif prefix == "video/":
                         result["total_videos"] += 1
                         has_video = True
                 if has_photo:
@@ -341,43 +1052,280 @@ def _get_attachment_details():
         return result
 
 
-def _count_attr(rows, key):
-    """Count non-empty values for a given attribute key across all rows."""
-    count = 0
+def _aggregate(rows, dist_keys, multi_keys=(), count_keys=()):
+    """Compute many distributions and counts in a single pass over rows.
+
+    Returns ``(dists, counts)``. ``dists`` maps every key in ``dist_keys``
+    and ``multi_keys`` to a Counter of raw values; multi-valued keys are
+    comma-separated lists counted per item. ``counts`` maps every key in
+    ``count_keys`` to its number of non-empty values, plus ``"coordinates"``
+    for rows that have both a latitude and a longitude.
+    """
+    dists = {key: Counter() for key in (*dist_keys, *multi_keys)}
+    # Resolve (key, counter) pairs once so the row loop skips dists[key]
+    dist_pairs = [(key, dists[key]) for key in dist_keys]
+    # Multi-valued items are gathered raw and stripped/counted in one go
+    # after the loop, which beats per-item strip() and += in Python.
+    multi_items = {key: [] for key in multi_keys}
+    multi_pairs = [(key, multi_items[key].extend) for key in multi_keys]
+    counts = dict.fromkeys(count_keys, 0)
+    coordinates = 0
     for attrs in rows:
-        val = attrs.get(key)
-        if val is not None and str(val).strip() != "":
-            count += 1
-    return count
+        get = attrs.get
+        for key, dist in dist_pairs:
+            val = get(key)
+            if val is None:
+                continue
+            # Only strings can be blank; skip str() for numbers and bools
+            if isinstance(val, str) and (not val or val.isspace()):
+                continue
+            dist[val] += 1
+        for key, extend in multi_pairs:
+            val = get(key)
+            if val:
+                extend(str(val).split(","))
+        for key in count_keys:
+            val = get(key)
+            if val is None:
+                continue
+            if isinstance(val, str) and (not val or val.isspace()):
+                continue
+            counts[key] += 1
+        if ((get("latitude") or get("corrected_lat"))
+                and (get("longitude") or get("corrected_lon"))):
+            coordinates += 1
+    counts["coordinates"] = coordinates
+    for key, items in multi_items.items():
+        dists[key].update(filter(None, map(str.strip, items)))
+    return dists, counts
+
+
+# Python-falsy JSON values, for the truthiness checks _aggregate() does on
+# coordinates (a missing key yields NULL and fails both tests as well).
+_COORDINATES_FILTER = """
+    (attributes->'latitude' NOT IN ('null', '""', '0', 'false')
+     OR attributes->'corrected_lat' NOT IN ('null', '""', '0', 'false'))
+    AND (attributes->'longitude' NOT IN ('null', '""', '0', 'false')
+         OR attributes->'corrected_lon' NOT IN ('null', '""', '0', 'false'))
+"""
 
 
-def _distribution(rows, key, label_map=None):
-    """Get value distribution for a given attribute key."""
-    dist = {}
-    for attrs in rows:
-        val = attrs.get(key)
-        if val is not None and str(val).strip() != "":
-            label = val
-            if label_map and val in label_map:
-                label = label_map[val]
-            dist[label] = dist.get(label, 0) + 1
-    return dict(sorted(dist.items(), key=lambda x: -x[1]))
+def _bump_report_counters(cur, ids=None):
+    """Add the given submissions (all of them if None) to report_counters.
+
+    report_counters holds /report's aggregates: (key, value) -> count for
+    REPORT_DIST_KEYS and the per-item counts of REPORT_MULTI_KEYS,
+    (key, '') -> non-empty count for REPORT_COUNT_KEYS plus "coordinates",
+    and ('*', '') -> total submissions. New rows reach it through
+    report_pending (see _fold_report_pending()), so INSERTs never wait on
+    these few hot rows.
+    """
+    where = "TRUE" if ids is None else "s.id = ANY(%(ids)s)"
+    cur.execute(f"""
+        INSERT INTO report_counters (field, bucket, count)
+        SELECT field, bucket, COUNT(*) FROM (
+            SELECT e.key AS field, e.value AS bucket
+            FROM survey_submissions AS s, jsonb_each_text(s.attributes) AS e
+            WHERE {where} AND e.key = ANY(%(keys)s) AND e.value ~ '\\S'
+            UNION ALL
+            SELECT e.key, trim(item)
+            FROM survey_submissions AS s, jsonb_each_text(s.attributes) AS e,
+                 unnest(string_to_array(e.value, ',')) AS item
+            WHERE {where} AND e.key = ANY(%(multi_keys)s)
+              AND trim(item) <> ''
+            UNION ALL
+            SELECT e.key, ''
+            FROM survey_submissions AS s, jsonb_each_text(s.attributes) AS e
+            WHERE {where} AND e.key = ANY(%(count_keys)s)
+              AND e.value ~ '\\S'
+            UNION ALL
+            SELECT 'coordinates', '' FROM survey_submissions AS s
+            WHERE {where} AND {_COORDINATES_FILTER}
+            UNION ALL
+            SELECT '*', '' FROM survey_submissions AS s WHERE {where}
+        ) AS c
+        GROUP BY 1, 2
+        -- A fixed row order keeps concurrent folds from deadlocking
+        ORDER BY 1, 2
+        ON CONFLICT (field, bucket)
+            DO UPDATE SET count = report_counters.count + EXCLUDED.count
+    """, {"ids": ids, "keys": list(REPORT_DIST_KEYS),
+          "multi_keys": list(REPORT_MULTI_KEYS),
+          "count_keys": list(REPORT_COUNT_KEYS)})
+
+
+def _report_keys_hash():
+    """Fingerprint of what report_counters counts; a change means rebuild."""
+    data = orjson.dumps([REPORT_DIST_KEYS, REPORT_MULTI_KEYS,
+                         REPORT_COUNT_KEYS, _COORDINATES_FILTER])
+    return hashlib.blake2b(data, digest_size=16).hexdigest()
+
+
+def _report_counters_current(cur):
+    """True if report_counters is fed by the trigger and has today's keys."""
+    cur.execute("""
+        SELECT EXISTS (
+                   SELECT 1 FROM pg_trigger
+                   WHERE tgrelid = 'survey_submissions'::regclass
+                     AND tgname = 'survey_submissions_report_pending'),
+               EXISTS (
+                   SELECT 1 FROM report_counters_meta WHERE keys_hash = %s)
+    """, (_report_keys_hash(),))
+    return all(cur.fetchone())
+
+
+def _rebuild_report_counters(cur, force=False):
+    """Recompute report_counters from every submission.
+
+    The statement trigger that queues new ids in report_pending is
+    (re)created first. Its lock holds off INSERTs, from this version or an
+    older one still serving during a deploy, until the transaction
+    commits, so every row is counted exactly once: here, or later from
+    report_pending.
+    """
+    cur.execute(
+        "LOCK TABLE survey_submissions IN SHARE ROW EXCLUSIVE MODE")
+    # Another process may have rebuilt while this one waited for the lock
+    if not force and _report_counters_current(cur):
+        return
+    cur.execute("""
+        DROP TRIGGER IF EXISTS survey_submissions_report_pending
+            ON survey_submissions;
+        CREATE TRIGGER survey_submissions_report_pending
+            AFTER INSERT ON survey_submissions
+            REFERENCING NEW TABLE AS new_rows
+            FOR EACH STATEMENT EXECUTE FUNCTION queue_report_pending();
+        TRUNCATE report_counters, report_pending, report_counters_meta;
+    """)
+    _bump_report_counters(cur)
+    cur.execute("INSERT INTO report_counters_meta (keys_hash) VALUES (%s)",
+                (_report_keys_hash(),))
+    logger.info("Rebuilt report_counters")
+
+
+def _fold_report_pending(cur):
+    """Add the submissions queued in report_pending to report_counters.
+
+    Deleted rows stay locked until commit, so concurrent folds never count
+    a submission twice, and rows still being inserted wait for the next.
+    """
+    cur.execute("DELETE FROM report_pending RETURNING id")
+    ids = [row[0] for row in cur]
+    if ids:
+        _bump_report_counters(cur, ids)
+
+
+def _read_report_counters(cur):
+    """Return ``(total, dists, counts)`` for /report from report_counters.
 
+    Folds report_pending in first, so run it in a transaction of its own.
 
-PHOTO_FIELDS = [
+    ``dists`` and ``counts`` have the same shape as _aggregate()'s, but come
+    from a few hundred counter rows instead of a scan of every submission.
+    """
+    dists = {key: Counter() for key in (*REPORT_DIST_KEYS, *REPORT_MULTI_KEYS)}
+    counts = dict.fromkeys((*REPORT_COUNT_KEYS, "coordinates"), 0)
+    total = 0
+    _fold_report_pending(cur)
+    cur.execute("""
+        SELECT field, bucket, count FROM report_counters
+        ORDER BY 3 DESC, 2
+    """)
+    for field, bucket, count in cur:
+        if field == "*":
+            total = count
+        elif bucket == "":
+            counts[field] = count
+        elif field in dists:
+            dists[field][bucket] = count
+    return total, dists, counts
+
+
+def _ranked(counter, label_map=None):
+    """Relabel a Counter from _aggregate and sort it by descending count."""
+    if not counter:
+        return {}
+    if label_map:
+        relabeled = Counter()
+        for val, cnt in counter.items():
+            relabeled[label_map.get(val, val)] += cnt
+        counter = relabeled
+    return dict(counter.most_common())
+
+
+# Keys aggregated by /report
+REPORT_DIST_KEYS = (
+    "agent_name", "category", "secondary_category", "company_status",
+    "location_correct", "building_number", "floor_number",
+    "working_days", "working_hours_each_day", "break_time_each_day",
+    "identity_correct", "is_landmark", "pickup_point_exists",
+    "has_physical_menu", "has_digital_menu",
+    "has_parking_lot", "valet_parking", "drive_thru",
+    "is_wheelchair_accessible", "wifi",
+    "dine_in", "only_delivery", "has_family_seating",
+    "has_separate_rooms_for_dining", "large_groups_can_be_seated",
+    "order_from_car",
+    "music", "live_sport_broadcasting", "shisha", "children_area",
+    "has_smoking_area", "has_a_waiting_area", "reservation",
+    "has_women_only_prayer_room",
+    "offers_iftar_menu", "is_open_during_suhoor", "provides_iftar_tent",
+    "require_ticket", "is_free_entry",
+)
+REPORT_MULTI_KEYS = ("language", "cuisine", "accepted_payment_methods")
+REPORT_COUNT_KEYS = (
+    "name_ar", "name_en", "phone_number", "website", "social_media",
+    "commercial_license_number", "license_photo",
+    "entrance_photo", "entrance_description",
+    "business_exterior", "exterior_photo_2",
+    "business_interior", "interior_photo_2",
+    "menu_photo_1", "menu_photo_2", "menu_photo_3",
+    "general_notes",
+)
+
+# Keys aggregated by /client-report (multi-valued keys as for /report)
+CLIENT_DIST_KEYS = (
+    "agent_name", "category", "secondary_category", "company_status",
+    "identity_correct", "location_correct", "building_number", "floor_number",
+    "working_days", "working_hours_each_day", "break_time_each_day",
+    "has_physical_menu", "has_digital_menu",
+    "has_parking_lot", "valet_parking", "drive_thru",
+    "is_wheelchair_accessible", "wifi",
+    "dine_in", "only_delivery", "has_family_seating",
+    "large_groups_can_be_seated", "order_from_car",
+    "music", "children_area", "shisha",
+    "has_smoking_area", "has_a_waiting_area", "reservation",
+    "has_women_only_prayer_room", "pickup_point_exists",
+    "offers_iftar_menu", "is_open_during_suhoor",
+)
+CLIENT_COUNT_KEYS = (
+    "name_ar", "name_en", "phone_number", "website", "social_media",
+    "commercial_license_number", "general_notes",
+)
+# (label, key) rows of the client report's data quality table
+CLIENT_QUALITY_FIELDS = (
+    ("Arabic Name", "name_ar"), ("English Name", "name_en"),
+    ("Category", "category"), ("Subcategory", "secondary_category"),
+    ("Status", "company_status"), ("Phone Number", "phone_number"),
+    ("Website", "website"), ("Working Days", "working_days"),
+    ("Working Hours", "working_hours_each_day"),
+    ("Social Media", "social_media"),
+)
+
+
+PHOTO_FIELDS = frozenset([
     "entrance_photo", "license_photo",
     "business_exterior", "exterior_photo_2",
     "business_interior", "interior_photo_2",
     "menu_photo_1", "menu_photo_2", "menu_photo_3",
     "additional_photo",
-]
+])
 
-VIDEO_FIELDS = [
+VIDEO_FIELDS = frozenset([
     "interior_walkthrough_video",
-]
+])
 
 # Fields to SKIP entirely from the report (business/legal name)
-SKIP_FIELDS = ["legal_name"]
+SKIP_FIELDS = frozenset(["legal_name"])
 
 CATEGORY_LABELS = {
     "health_medical": "Health & Medical",
@@ -422,6 +1370,7 @@ CSV_CATEGORY_MAP = {
     "Restaurant": "Restaurants",
     "restaurants": "Restaurants",
     "Café": "Restaurants",
+    "CafÃ©": "Restaurants",
     "Coffee Shop": "Restaurants",
     "Coffee Shops": "Restaurants",
     "Bakery": "Restaurants",
@@ -517,6 +1466,13 @@ CSV_CATEGORY_MAP = {
     "Gym": "Entertainment & Sports",
 }
 
+# Casefolded category -> its spelling as a CSV_CATEGORY_MAP key, so the
+# loader can canonicalize case/encoding variants with one lookup per row
+_CSV_CATEGORY_KEYS = {k.casefold(): k for k in CSV_CATEGORY_MAP}
+
+# Raw category (survey code or CSV name) -> client report group
+CLIENT_CATEGORY_LABELS = {**CATEGORY_LABELS, **CSV_CATEGORY_MAP}
+
 CSV_COL_MAP = {
     "GlobalID": "global_id",
     "Name (Arabic)": "name_ar",
@@ -580,403 +1536,452 @@ CSV_COL_MAP = {
 }
 
 
+def _clean_csv_value(val):
+    """Normalize one raw CSV cell: blanks/#ERROR!/N/A -> "", yes/no lowercased."""
+    val = val.strip()
+    if not val or val == "#ERROR!" or val == "N/A":
+        return ""
+    lowered = val.lower()
+    if lowered in ("yes", "no"):
+        return lowered
+    return val
+
+
+_csv_cache = {"key": None, "rows": None}
+
+
 def _load_csv_data():
-    """Load POI data from the final CSV file and return list of attribute dicts."""
-    if not os.path.exists(CSV_DATA_PATH):
+    """Load POI data from the final CSV file and return list of attribute dicts.
+
+    The parsed rows are cached until the file's mtime or size changes, so
+    callers must treat them as read-only.
+    """
+    try:
+        st = os.stat(CSV_DATA_PATH)
+    except OSError:
         return None
+    key = (CSV_DATA_PATH, st.st_mtime_ns, st.st_size)
+    if _csv_cache["key"] != key:
+        _csv_cache.update(key=key, rows=_parse_csv_data(CSV_DATA_PATH))
+    return _csv_cache["rows"]
+
+
+def _parse_csv_data(path):
+    """Parse the final CSV file into a list of attribute dicts."""
     rows = []
-    with open(CSV_DATA_PATH, "r", encoding="utf-8") as f:
-        reader = csv.DictReader(f)
+    with open(path, "r", encoding="utf-8") as f:
+        reader = csv.reader(f)
+        header = next(reader, [])
+        # Resolve CSV_COL_MAP to column positions once (last duplicate wins,
+        # as with DictReader); columns missing from the file give "".
+        positions = {name: i for i, name in enumerate(header)}
+        columns = [(positions.get(csv_col), attr_key)
+                   for csv_col, attr_key in CSV_COL_MAP.items()]
+        # Cleaned values are memoized and interned: every row shares one
+        # object per distinct answer, and "yes"/"no" are the same objects
+        # as the literals the reports look them up with.
+        cleaned = {"": ""}
         for row in reader:
+            if not row:
+                continue
+            width = len(row)
             attrs = {}
-            for csv_col, attr_key in CSV_COL_MAP.items():
-                val = row.get(csv_col, "").strip()
-                if val and val != "#ERROR!":
-                    # Normalize yes/no values to lowercase
-                    if val.lower() in ("yes", "no"):
-                        val = val.lower()
-                    elif val == "N/A":
-                        val = ""
-                    attrs[attr_key] = val
-                else:
-                    attrs[attr_key] = ""
-            # Normalize category names with special characters
-            cat = attrs.get("category", "")
-            if cat.lower().startswith("caf"):
-                attrs["category"] = "Cafe"
+            for idx, attr_key in columns:
+                raw = row[idx] if idx is not None and idx < width else ""
+                val = cleaned.get(raw)
+                if val is None:
+                    val = cleaned[raw] = sys.intern(_clean_csv_value(raw))
+                attrs[attr_key] = val
+            # Normalize category spelling (case, "Café" encodings)
+            cat = attrs["category"]
+            attrs["category"] = _CSV_CATEGORY_KEYS.get(cat.casefold(), cat)
             rows.append(attrs)
     return rows
 
 
-REPORT_CSS = """
-*{margin:0;padding:0;box-sizing:border-box}
-body{font-family:'Segoe UI',-apple-system,BlinkMacSystemFont,Roboto,sans-serif;
-color:#333;line-height:1.6;padding:40px;max-width:1100px;margin:0 auto;background:#fff}
-.report-header{text-align:center;padding:48px 0 32px;border-bottom:3px solid #31872e;margin-bottom:40px}
-.report-header h1{font-size:32px;color:#31872e;margin-bottom:4px}
-.report-header .subtitle{font-size:18px;color:#178783;margin-bottom:8px}
-.report-header p{color:#666;font-size:14px}
-.kpi-grid{display:grid;grid-template-columns:repeat(auto-fit,minmax(150px,1fr));gap:16px;margin-bottom:48px}
-.kpi-card{background:#f8f9fa;border-left:4px solid #31872e;padding:20px;border-radius:0 8px 8px 0}
-.kpi-card .value{font-size:36px;font-weight:700;color:#31872e;line-height:1.2}
-.kpi-card .label{font-size:12px;color:#666;text-transform:uppercase;letter-spacing:.5px;margin-top:4px}
-.section{margin-bottom:48px;page-break-inside:avoid}
-.section h2{font-size:22px;color:#31872e;border-bottom:2px solid #e0e0e0;padding-bottom:8px;margin-bottom:20px}
-.section h3{font-size:16px;color:#333;margin:16px 0 12px}
-table{width:100%;border-collapse:collapse;margin-bottom:20px;font-size:14px}
-th{background:#31872e;color:#fff;text-align:left;padding:10px 14px;font-size:12px;
-text-transform:uppercase;letter-spacing:.5px;font-weight:600}
-td{padding:10px 14px;border-bottom:1px solid #e0e0e0}
-tr:nth-child(even){background:#fafafa}
-.bar-row{display:flex;align-items:center;gap:12px;margin:6px 0}
-.bar-label{min-width:180px;font-size:14px;white-space:nowrap;overflow:hidden;text-overflow:ellipsis}
-.bar-track{flex:1;background:#e8e8e8;border-radius:4px;height:22px;overflow:hidden}
-.bar-fill{height:100%;border-radius:4px;background:#31872e;min-width:2px}
-.bar-value{min-width:60px;text-align:right;font-weight:600;font-size:14px;color:#333}
-.badge{display:inline-block;padding:2px 10px;border-radius:12px;font-size:12px;font-weight:600}
-.badge-high{background:#d4edda;color:#155724}
-.badge-medium{background:#fff3cd;color:#856404}
-.badge-low{background:#f8d7da;color:#721c24}
-.two-col{display:grid;grid-template-columns:1fr 1fr;gap:32px}
-.metric-row{display:flex;justify-content:space-between;padding:8px 0;border-bottom:1px solid #e0e0e0}
-.metric-row .label{color:#666}
-.metric-row .value{font-weight:600}
-.footer{text-align:center;padding:32px 0;border-top:2px solid #e0e0e0;color:#666;font-size:13px;margin-top:48px}
-@media print{body{padding:20px}.section{page-break-inside:avoid}}
-@media(max-width:768px){.two-col{grid-template-columns:1fr}.kpi-grid{grid-template-columns:repeat(2,1fr)}
-body{padding:16px}.bar-label{min-width:120px}}
-"""
+def _as_float(val):
+    try:
+        return float(val)
+    except (TypeError, ValueError):
+        return None
+
+
+# PostgreSQL binary COPY framing: signature, flags and header extension
+_PGCOPY_HEADER = b"PGCOPY\n\xff\r\n\x00" + struct.pack("!ii", 0, 0)
+_PGCOPY_NULL = struct.pack("!i", -1)
+_PGCOPY_TRAILER = struct.pack("!h", -1)
+
+
+def _pgcopy_text(val):
+    if val is None:
+        return _PGCOPY_NULL
+    data = val.encode()
+    return struct.pack("!i", len(data)) + data
+
+
+def _pgcopy_float8(val):
+    return _PGCOPY_NULL if val is None else struct.pack("!id", 8, val)
+
+
+def _pgcopy_jsonb(data):
+    # jsonb's binary form is a version byte followed by the JSON text
+    return struct.pack("!ib", len(data) + 1, 1) + data
+
+
+def bulk_load(rows, event_type="csv_import"):
+    """Insert attribute dicts (e.g. from _load_csv_data) with binary COPY.
+
+    Rows are streamed as one ``COPY ... FROM STDIN (FORMAT binary)``, which
+    skips INSERT's per-row SQL parsing and literal quoting. COPY cannot run
+    on a green (psycogreen) connection, so this is for the CLI, not request
+    handlers. Returns the number of rows inserted.
+    """
+    with get_db() as conn:
+        with conn.cursor() as cur:
+            event = _pgcopy_text(event_type)
+            # Tuple header: the number of fields that follow
+            fields = struct.pack("!h", 11)
+            chunks = [_PGCOPY_HEADER]
+            for attrs in rows:
+                get = attrs.get
+                chunks += (
+                    fields,
+                    _pgcopy_text(get("global_id") or None), event,
+                    _pgcopy_text(get("agent_name", "")),
+                    _pgcopy_text(get("agent_id", "")),
+                    _pgcopy_text(get("name_ar", "")),
+                    _pgcopy_text(get("name_en", "")),
+                    _pgcopy_text(get("category", "")),
+                    _pgcopy_text(get("secondary_category", "")),
+                    _pgcopy_float8(_as_float(get("latitude"))),
+                    _pgcopy_float8(_as_float(get("longitude"))),
+                    _pgcopy_jsonb(orjson.dumps(attrs)),
+                )
+            chunks.append(_PGCOPY_TRAILER)
+            cur.copy_expert("""
+                COPY survey_submissions
+                    (global_id, event_type, agent_name, agent_id,
+                     poi_name_ar, poi_name_en, category, subcategory,
+                     latitude, longitude, attributes)
+                FROM STDIN WITH (FORMAT binary)
+            """, io.BytesIO(b"".join(chunks)))
+    return len(rows)
+
+
+@app.cli.command("init-db")
+def init_db_command():
+    """Create the tables and indexes, e.g. as a deploy step."""
+    init_db()
+    build_indexes()
+
+
+@app.cli.command("rebuild-report-counters")
+def rebuild_report_counters_command():
+    """Recompute report_counters from survey_submissions.
+
+    Needed after editing rows by hand; init_db() already rebuilds when the
+    REPORT_*_KEYS tuples change.
+    """
+    _ensure_db()
+    with get_db() as conn:
+        with conn.cursor() as cur:
+            _rebuild_report_counters(cur, force=True)
+
+
+@app.cli.command("load-csv")
+def load_csv_command():
+    """Bulk-load data/final_data.csv into survey_submissions."""
+    _ensure_db()
+    rows = _load_csv_data()
+    if rows is None:
+        logger.error("CSV not found: %s", CSV_DATA_PATH)
+        return
+    logger.info("Loaded %d CSV rows into survey_submissions", bulk_load(rows))
+
+
+# Rendered reports are served with an ETag derived from their inputs (the
+# data fingerprint and the attachment summary). A matching If-None-Match
+# gets a 304, and the last body per endpoint is reused while the ETag holds.
+REPORT_MAX_AGE = 60
+# Within this many seconds of a build, and until this process takes a
+# webhook, /report skips the fingerprint query
+REPORT_FRESH_TTL = 15
+# endpoint -> (etag, body bytes, monotonic time stored, _data_version)
+_response_cache = {}
+_report_lock = threading.Lock()
+
+
+def _etag(*parts):
+    """Hash the inputs a response was built from into an ETag value."""
+    data = orjson.dumps(parts, default=str, option=orjson.OPT_SORT_KEYS
+                        | orjson.OPT_NON_STR_KEYS)
+    return hashlib.blake2b(data, digest_size=16).hexdigest()
+
+
+def _db_fingerprint(cur):
+    """Cheap summary of survey_submissions that changes on every write.
+
+    Returns ``(count, max id, max received_at, min submitted_at, max
+    submitted_at)``; /client-report also uses the count and date range.
+    """
+    cur.execute("""
+        SELECT COUNT(*), MAX(id), MAX(received_at),
+               MIN(submitted_at), MAX(submitted_at)
+        FROM survey_submissions
+    """)
+    return cur.fetchone()
+
+
+def _with_validators(resp, etag):
+    resp.set_etag(etag)
+    resp.headers["Cache-Control"] = f"private, max-age={REPORT_MAX_AGE}"
+    return resp
+
+
+def _etag_matches(etag):
+    """True if If-None-Match has ``etag``, as sent or as Flask-Compress
+    re-tagged it with a ``:<algorithm>`` suffix."""
+    tags = request.if_none_match
+    return tags.contains(etag) or any(
+        tags.contains(f"{etag}:{algo}")
+        for algo in app.config["COMPRESS_ALGORITHM"])
+
+
+def _cached_response(key, etag, mimetype):
+    """Return a 304 or the memoized body for ``etag``, or None on a miss."""
+    if _etag_matches(etag):
+        return _with_validators(Response(status=304), etag)
+    cached = _response_cache.get(key)
+    if cached is None or cached[0] != etag:
+        return None
+    return _with_validators(Response(cached[1], mimetype=mimetype), etag)
+
+
+def _store_response(key, etag, body):
+    _response_cache[key] = (etag, body, time.monotonic(), _data_version)
+
+
+def _fresh_response(key, mimetype):
+    """Like _cached_response(), without a fingerprint, while the entry is
+    younger than REPORT_FRESH_TTL."""
+    cached = _response_cache.get(key)
+    if (cached is None or cached[3] != _data_version
+            or time.monotonic() >= cached[2] + REPORT_FRESH_TTL):
+        return None
+    return _cached_response(key, cached[0], mimetype)
+
+
+def _tee_response(key, etag, chunks):
+    """Yield ``chunks`` and memoize the body once it has been fully sent.
+
+    The body is stored as UTF-8 bytes so repeat responses skip re-encoding.
+    """
+    parts = []
+    for chunk in chunks:
+        parts.append(chunk)
+        yield chunk
+    _store_response(key, etag, "".join(parts).encode())
+
+
+# Client report HTML lives in templates/client_report.html. It is compiled
+# once at import and streamed, flushing every CLIENT_REPORT_BUFFER pieces.
+CLIENT_REPORT_TEMPLATE = app.jinja_env.get_template("client_report.html")
+CLIENT_REPORT_BUFFER = 100
+CLIENT_REPORT_ITERSIZE = 2000
+
+
+# /report sections, in output order: (title, ((field, source), ...)).
+# A source is ("dist", key[, label_map]) for a ranked distribution,
+# ("count", key, ...) for the summed non-empty counts of those keys, or
+# ("videos",) for the ArcGIS video total. Empty values are left out, and
+# so are sections with nothing left.
+REPORT_SECTIONS = (
+    ("Agents", (
+        ("agent_distribution", ("dist", "agent_name")),
+    )),
+    ("1. Identity & Names", (
+        ("names_arabic_collected", ("count", "name_ar")),
+        ("names_english_collected", ("count", "name_en")),
+        ("identity_correct", ("dist", "identity_correct")),
+    )),
+    ("2. Category", (
+        ("category_distribution", ("dist", "category", CATEGORY_LABELS)),
+        ("subcategory_distribution", ("dist", "secondary_category")),
+    )),
+    ("3. Company Status", (
+        ("status_distribution", ("dist", "company_status", STATUS_LABELS)),
+    )),
+    ("4. Commercial License", (
+        ("licenses_collected", ("count", "commercial_license_number")),
+        ("license_photos_taken", ("count", "license_photo")),
+    )),
+    ("5. Coordinates", (
+        ("pois_with_coordinates", ("count", "coordinates")),
+        ("location_correct", ("dist", "location_correct")),
+    )),
+    ("6. Building & Floor", (
+        ("building_distribution", ("dist", "building_number")),
+        ("floor_distribution", ("dist", "floor_number")),
+    )),
+    ("7. Entrance", (
+        ("entrance_photos_taken", ("count", "entrance_photo")),
+        ("entrance_descriptions", ("count", "entrance_description")),
+    )),
+    ("8. Contact Info", (
+        ("phone_numbers_collected", ("count", "phone_number")),
+        ("websites_collected", ("count", "website")),
+        ("social_media_collected", ("count", "social_media")),
+    )),
+    ("9. Language, Landmark & Pickup", (
+        ("languages_distribution", ("dist", "language")),
+        ("is_landmark", ("dist", "is_landmark")),
+        ("pickup_point_exists", ("dist", "pickup_point_exists")),
+    )),
+    ("10. Working Hours", (
+        ("working_days_distribution", ("dist", "working_days")),
+        ("working_hours_distribution", ("dist", "working_hours_each_day")),
+        ("break_time_distribution", ("dist", "break_time_each_day")),
+    )),
+    ("11. Business Exterior Photos", (
+        ("exterior_photos_taken",
+         ("count", "business_exterior", "exterior_photo_2")),
+    )),
+    ("12. Business Interior Photos", (
+        ("interior_photos_taken",
+         ("count", "business_interior", "interior_photo_2")),
+    )),
+    ("13. Interior Walkthrough Video", (
+        ("videos_taken", ("videos",)),
+    )),
+    ("14. Physical Menu Photos", (
+        ("has_physical_menu", ("dist", "has_physical_menu")),
+        ("menu_photos_taken",
+         ("count", "menu_photo_1", "menu_photo_2", "menu_photo_3")),
+    )),
+    ("15. Digital Menu / QR", (
+        ("has_digital_menu", ("dist", "has_digital_menu")),
+    )),
+    ("16. Cuisine", (
+        ("cuisine_distribution", ("dist", "cuisine")),
+    )),
+    ("17. Payment Methods", (
+        ("payment_distribution", ("dist", "accepted_payment_methods")),
+    )),
+    ("18. Parking & Valet", (
+        ("has_parking", ("dist", "has_parking_lot")),
+        ("valet_parking", ("dist", "valet_parking")),
+        ("drive_thru", ("dist", "drive_thru")),
+    )),
+    ("19. Accessibility & WiFi", (
+        ("wheelchair_accessible", ("dist", "is_wheelchair_accessible")),
+        ("wifi_available", ("dist", "wifi")),
+    )),
+    ("20. Seating", (
+        ("dine_in", ("dist", "dine_in")),
+        ("only_delivery", ("dist", "only_delivery")),
+        ("family_seating", ("dist", "has_family_seating")),
+        ("separate_dining_rooms", ("dist", "has_separate_rooms_for_dining")),
+        ("large_groups", ("dist", "large_groups_can_be_seated")),
+        ("order_from_car", ("dist", "order_from_car")),
+    )),
+    ("21. Entertainment", (
+        ("music", ("dist", "music")),
+        ("live_sports", ("dist", "live_sport_broadcasting")),
+        ("shisha", ("dist", "shisha")),
+        ("children_area", ("dist", "children_area")),
+    )),
+    ("22. Smoking & Waiting", (
+        ("smoking_area", ("dist", "has_smoking_area")),
+        ("waiting_area", ("dist", "has_a_waiting_area")),
+        ("reservation", ("dist", "reservation")),
+    )),
+    ("23. Prayer Rooms", (
+        ("women_prayer_room", ("dist", "has_women_only_prayer_room")),
+    )),
+    ("24. Iftar & Suhoor", (
+        ("offers_iftar", ("dist", "offers_iftar_menu")),
+        ("open_during_suhoor", ("dist", "is_open_during_suhoor")),
+        ("iftar_tent", ("dist", "provides_iftar_tent")),
+    )),
+    ("25. Attraction / Special", (
+        ("require_ticket", ("dist", "require_ticket")),
+        ("free_entry", ("dist", "is_free_entry")),
+    )),
+    ("Notes", (
+        ("submissions_with_notes", ("count", "general_notes")),
+    )),
+)
 
 
 @app.route("/report", methods=["GET"])
 def report():
     try:
-        with get_db() as conn:
-            with conn.cursor() as cur:
-                cur.execute("""
-                    SELECT attributes, agent_name, category, subcategory,
-                           submitted_at, received_at
-                    FROM survey_submissions
-                    ORDER BY submitted_at
-                """)
-                columns = [desc[0] for desc in cur.description]
-                raw_rows = [dict(zip(columns, row)) for row in cur.fetchall()]
-
-        all_attrs = [r.get("attributes") or {} for r in raw_rows]
-        total_pois = len(raw_rows)
-
-        # --- Photos & Videos from ArcGIS attachments ---
-        arcgis_photos, arcgis_videos = _get_attachment_counts()
-        total_photos = arcgis_photos if arcgis_photos is not None else 0
-        total_videos = arcgis_videos if arcgis_videos is not None else 0
-
-        # --- Agent breakdown ---
-        agent_dist = _distribution(all_attrs, "agent_name")
-
-        # --- Category breakdown ---
-        category_dist = _distribution(all_attrs, "category", CATEGORY_LABELS)
-
-        # --- Subcategory breakdown ---
-        subcategory_dist = _distribution(all_attrs, "secondary_category")
-
-        # --- Status breakdown ---
-        status_dist = _distribution(all_attrs, "company_status", STATUS_LABELS)
-
-        # --- Coordinates: only include if there are answers ---
-        coords_answered = 0
-        for attrs in all_attrs:
-            lat = attrs.get("latitude") or attrs.get("corrected_lat")
-            lon = attrs.get("longitude") or attrs.get("corrected_lon")
-            if lat and lon:
-                coords_answered += 1
-        location_correct_dist = _distribution(all_attrs, "location_correct")
-
-        # --- Building & Floor ---
-        building_dist = _distribution(all_attrs, "building_number")
-        floor_dist = _distribution(all_attrs, "floor_number")
-
-        # --- Contact ---
-        phone_count = _count_attr(all_attrs, "phone_number")
-        website_count = _count_attr(all_attrs, "website")
-        social_count = _count_attr(all_attrs, "social_media")
-
-        # --- License ---
-        license_count = _count_attr(all_attrs, "commercial_license_number")
-        license_photo_count = _count_attr(all_attrs, "license_photo")
-
-        # --- Hours ---
-        working_days_dist = _distribution(all_attrs, "working_days")
-        working_hours_dist = _distribution(all_attrs, "working_hours_each_day")
-        break_time_dist = _distribution(all_attrs, "break_time_each_day")
-
-        # --- Identity (name corrections, EXCLUDING legal_name) ---
-        identity_correct_dist = _distribution(all_attrs, "identity_correct")
-        name_ar_count = _count_attr(all_attrs, "name_ar")
-        name_en_count = _count_attr(all_attrs, "name_en")
-
-        # --- Language ---
-        language_dist = {}
-        for attrs in all_attrs:
-            lang_val = attrs.get("language", "")
-            if lang_val:
-                for lang in str(lang_val).split(","):
-                    lang = lang.strip()
-                    if lang:
-                        language_dist[lang] = language_dist.get(lang, 0) + 1
-        language_dist = dict(sorted(language_dist.items(), key=lambda x: -x[1]))
-
-        # --- Landmark & Pickup ---
-        landmark_dist = _distribution(all_attrs, "is_landmark")
-        pickup_dist = _distribution(all_attrs, "pickup_point_exists")
-
-        # --- Entrance ---
-        entrance_photo_count = _count_attr(all_attrs, "entrance_photo")
-        entrance_desc_count = _count_attr(all_attrs, "entrance_description")
-
-        # --- Menu ---
-        physical_menu_dist = _distribution(all_attrs, "has_physical_menu")
-        digital_menu_dist = _distribution(all_attrs, "has_digital_menu")
-
-        # --- Cuisine ---
-        cuisine_dist = {}
-        for attrs in all_attrs:
-            c_val = attrs.get("cuisine", "")
-            if c_val:
-                for c in str(c_val).split(","):
-                    c = c.strip()
-                    if c:
-                        cuisine_dist[c] = cuisine_dist.get(c, 0) + 1
-        cuisine_dist = dict(sorted(cuisine_dist.items(), key=lambda x: -x[1]))
-
-        # --- Payment ---
-        payment_dist = {}
-        for attrs in all_attrs:
-            p_val = attrs.get("accepted_payment_methods", "")
-            if p_val:
-                for p in str(p_val).split(","):
-                    p = p.strip()
-                    if p:
-                        payment_dist[p] = payment_dist.get(p, 0) + 1
-        payment_dist = dict(sorted(payment_dist.items(), key=lambda x: -x[1]))
-
-        # --- Parking ---
-        parking_dist = _distribution(all_attrs, "has_parking_lot")
-        valet_dist = _distribution(all_attrs, "valet_parking")
-        drive_thru_dist = _distribution(all_attrs, "drive_thru")
-
-        # --- Accessibility ---
-        wheelchair_dist = _distribution(all_attrs, "is_wheelchair_accessible")
-        wifi_dist = _distribution(all_attrs, "wifi")
-
-        # --- Seating ---
-        dine_in_dist = _distribution(all_attrs, "dine_in")
-        delivery_dist = _distribution(all_attrs, "only_delivery")
-        family_dist = _distribution(all_attrs, "has_family_seating")
-        separate_rooms_dist = _distribution(all_attrs, "has_separate_rooms_for_dining")
-        large_groups_dist = _distribution(all_attrs, "large_groups_can_be_seated")
-        order_car_dist = _distribution(all_attrs, "order_from_car")
-
-        # --- Entertainment ---
-        music_dist = _distribution(all_attrs, "music")
-        sports_dist = _distribution(all_attrs, "live_sport_broadcasting")
-        shisha_dist = _distribution(all_attrs, "shisha")
-        children_dist = _distribution(all_attrs, "children_area")
-
-        # --- Smoking & Waiting ---
-        smoking_dist = _distribution(all_attrs, "has_smoking_area")
-        waiting_dist = _distribution(all_attrs, "has_a_waiting_area")
-        reservation_dist = _distribution(all_attrs, "reservation")
-
-        # --- Prayer ---
-        prayer_dist = _distribution(all_attrs, "has_women_only_prayer_room")
-
-        # --- Ramadan ---
-        iftar_dist = _distribution(all_attrs, "offers_iftar_menu")
-        suhoor_dist = _distribution(all_attrs, "is_open_during_suhoor")
-        iftar_tent_dist = _distribution(all_attrs, "provides_iftar_tent")
-
-        # --- Special ---
-        ticket_dist = _distribution(all_attrs, "require_ticket")
-        free_entry_dist = _distribution(all_attrs, "is_free_entry")
-
-        # --- Notes ---
-        notes_count = _count_attr(all_attrs, "general_notes")
-
-        # Build report - only include sections that have data
-        report_data = {
-            "report_title": "POI Field Survey Report",
-            "generated_at": datetime.now(timezone.utc).isoformat(),
-            "version": "2.1",
-            "total_pois_gathered": total_pois,
-            "total_photos_taken": total_photos,
-            "total_videos_taken": total_videos,
-            "sections": []
-        }
-
-        def add_section(title, data_dict):
-            """Only add section if it has non-empty data."""
-            # Filter out empty distributions
-            filtered = {}
-            for k, v in data_dict.items():
-                if isinstance(v, dict) and len(v) == 0:
-                    continue
-                if isinstance(v, int) and v == 0:
-                    continue
-                if v is None:
-                    continue
-                filtered[k] = v
-            if filtered:
-                report_data["sections"].append({
-                    "title": title,
-                    **filtered
-                })
-
-        add_section("Agents", {
-            "agent_distribution": agent_dist,
-        })
-
-        add_section("1. Identity & Names", {
-            "names_arabic_collected": name_ar_count,
-            "names_english_collected": name_en_count,
-            "identity_correct": identity_correct_dist,
-        })
-
-        add_section("2. Category", {
-            "category_distribution": category_dist,
-            "subcategory_distribution": subcategory_dist,
-        })
-
-        add_section("3. Company Status", {
-            "status_distribution": status_dist,
-        })
-
-        add_section("4. Commercial License", {
-            "licenses_collected": license_count,
-            "license_photos_taken": license_photo_count,
-        })
-
-        add_section("5. Coordinates", {
-            "pois_with_coordinates": coords_answered,
-            "location_correct": location_correct_dist,
-        })
-
-        add_section("6. Building & Floor", {
-            "building_distribution": building_dist,
-            "floor_distribution": floor_dist,
-        })
-
-        add_section("7. Entrance", {
-            "entrance_photos_taken": entrance_photo_count,
-            "entrance_descriptions": entrance_desc_count,
-        })
-
-        add_section("8. Contact Info", {
-            "phone_numbers_collected": phone_count,
-            "websites_collected": website_count,
-            "social_media_collected": social_count,
-        })
-
-        add_section("9. Language, Landmark & Pickup", {
-            "languages_distribution": language_dist,
-            "is_landmark": landmark_dist,
-            "pickup_point_exists": pickup_dist,
-        })
-
-        add_section("10. Working Hours", {
-            "working_days_distribution": working_days_dist,
-            "working_hours_distribution": working_hours_dist,
-            "break_time_distribution": break_time_dist,
-        })
-
-        add_section("11. Business Exterior Photos", {
-            "exterior_photos_taken": _count_attr(all_attrs, "business_exterior")
-                                    + _count_attr(all_attrs, "exterior_photo_2"),
-        })
-
-        add_section("12. Business Interior Photos", {
-            "interior_photos_taken": _count_attr(all_attrs, "business_interior")
-                                    + _count_attr(all_attrs, "interior_photo_2"),
-        })
-
-        add_section("13. Interior Walkthrough Video", {
-            "videos_taken": total_videos,
-        })
-
-        add_section("14. Physical Menu Photos", {
-            "has_physical_menu": physical_menu_dist,
-            "menu_photos_taken": _count_attr(all_attrs, "menu_photo_1")
-                                + _count_attr(all_attrs, "menu_photo_2")
-                                + _count_attr(all_attrs, "menu_photo_3"),
-        })
-
-        add_section("15. Digital Menu / QR", {
-            "has_digital_menu": digital_menu_dist,
-        })
-
-        add_section("16. Cuisine", {
-            "cuisine_distribution": cuisine_dist,
-        })
-
-        add_section("17. Payment Methods", {
-            "payment_distribution": payment_dist,
-        })
-
-        add_section("18. Parking & Valet", {
-            "has_parking": parking_dist,
-            "valet_parking": valet_dist,
-            "drive_thru": drive_thru_dist,
-        })
-
-        add_section("19. Accessibility & WiFi", {
-            "wheelchair_accessible": wheelchair_dist,
-            "wifi_available": wifi_dist,
-        })
-
-        add_section("20. Seating", {
-            "dine_in": dine_in_dist,
-            "only_delivery": delivery_dist,
-            "family_seating": family_dist,
-            "separate_dining_rooms": separate_rooms_dist,
-            "large_groups": large_groups_dist,
-            "order_from_car": order_car_dist,
-        })
-
-        add_section("21. Entertainment", {
-            "music": music_dist,
-            "live_sports": sports_dist,
-            "shisha": shisha_dist,
-            "children_area": children_dist,
-        })
-
-        add_section("22. Smoking & Waiting", {
-            "smoking_area": smoking_dist,
-            "waiting_area": waiting_dist,
-            "reservation": reservation_dist,
-        })
-
-        add_section("23. Prayer Rooms", {
-            "women_prayer_room": prayer_dist,
-        })
-
-        add_section("24. Iftar & Suhoor", {
-            "offers_iftar": iftar_dist,
-            "open_during_suhoor": suhoor_dist,
-            "iftar_tent": iftar_tent_dist,
-        })
-
-        add_section("25. Attraction / Special", {
-            "require_ticket": ticket_dist,
-            "free_entry": free_entry_dist,
-        })
-
-        add_section("Notes", {
-            "submissions_with_notes": notes_count,
-        })
-
-        return jsonify(report_data), 200
+        resp = _fresh_response("report", "application/json")
+        if resp is not None:
+            return resp
+        # One request rebuilds at a time; the others wait and reuse its result
+        with _report_lock:
+            resp = _fresh_response("report", "application/json")
+            if resp is not None:
+                return resp
+
+            # --- Photos & Videos from ArcGIS attachments ---
+            arcgis_photos, arcgis_videos = _get_attachment_counts()
+
+            with get_db() as conn:
+                with conn.cursor() as cur:
+                    # Kept current by the webhook, so this reads counters
+                    # rather than aggregating every submission.
+                    total_pois, dists, counts = _read_report_counters(cur)
+            # The report is built from exactly these inputs, so they double
+            # as the fingerprint without a scan of survey_submissions.
+            etag = _etag(total_pois, dists, counts,
+                         arcgis_photos, arcgis_videos)
+            cached = _cached_response("report", etag, "application/json")
+            if cached is not None:
+                return cached
+
+            total_photos = arcgis_photos if arcgis_photos is not None else 0
+            total_videos = arcgis_videos if arcgis_videos is not None else 0
+
+            def value(source):
+                kind, *args = source
+                if kind == "dist":
+                    return _ranked(dists[args[0]], *args[1:])
+                if kind == "count":
+                    return sum(counts[key] for key in args)
+                return total_videos
+
+            report_data = {
+                "report_title": "POI Field Survey Report",
+                "generated_at": datetime.now(timezone.utc).isoformat(),
+                "version": "2.1",
+                "total_pois_gathered": total_pois,
+                "total_photos_taken": total_photos,
+                "total_videos_taken": total_videos,
+                "sections": []
+            }
+            for title, fields in REPORT_SECTIONS:
+                data = {}
+                for name, source in fields:
+                    val = value(source)
+                    if val:
+                        data[name] = val
+                if data:
+                    report_data["sections"].append(
+                        {"title": title, **data})
+
+            resp = jsonify(report_data)
+            _store_response("report", etag, resp.get_data())
+            return _with_validators(resp, etag)
 
     except Exception as e:
         logger.error("Report error: %s", str(e), exc_info=True)
+        stale = _response_cache.get("report")
+        if stale is not None:
+            # Better an older report than none while the DB is unavailable
+            return _with_validators(
+                Response(stale[1], mimetype="application/json"), stale[0])
         return jsonify({"status": "error", "message": str(e)}), 500
 
 
@@ -984,47 +1989,65 @@ def report():
 def client_report():
     try:
         # --- Load data from CSV (final data) or fall back to DB ---
-        csv_data = _load_csv_data()
+        # The ArcGIS attachment query runs in the background meanwhile.
+        with ThreadPoolExecutor(max_workers=1) as pool:
+            att_future = pool.submit(_get_attachment_details)
+            csv_data = _load_csv_data()
+            if csv_data is not None:
+                data_key = _csv_cache["key"]
+            else:
+                with get_db() as conn:
+                    with conn.cursor() as cur:
+                        data_key = _db_fingerprint(cur)
+            att = att_future.result()
+
+        etag = _etag(data_key, att)
+        cached = _cached_response("client-report", etag, "text/html")
+        if cached is not None:
+            return cached
+
+        # --- Distributions and counts in a single pass ---
         if csv_data is not None:
-            all_attrs = csv_data
-            total_pois = len(all_attrs)
+            total_pois = len(csv_data)
+            raw_dists, counts = _aggregate(csv_data, CLIENT_DIST_KEYS,
+                                           REPORT_MULTI_KEYS,
+                                           CLIENT_COUNT_KEYS)
         else:
+            total_pois, _, _, first_submitted, last_submitted = data_key
             with get_db() as conn:
-                with conn.cursor() as cur:
-                    cur.execute("""
-                        SELECT attributes, agent_name, submitted_at
-                        FROM survey_submissions
-                        ORDER BY submitted_at
-                    """)
-                    columns = [desc[0] for desc in cur.description]
-                    raw_rows = [dict(zip(columns, row)) for row in cur.fetchall()]
-            all_attrs = [r.get("attributes") or {} for r in raw_rows]
-            total_pois = len(all_attrs)
-        esc = _esc
+                # Aggregate straight off a server-side cursor so only
+                # CLIENT_REPORT_ITERSIZE rows are held in memory at a time.
+                # No ORDER BY: ties in a ranking follow the table's order.
+                with conn.cursor(name="client_report_rows") as cur:
+                    cur.itersize = CLIENT_REPORT_ITERSIZE
+                    cur.execute("SELECT attributes FROM survey_submissions")
+                    raw_dists, counts = _aggregate(
+                        (row[0] or {} for row in cur), CLIENT_DIST_KEYS,
+                        REPORT_MULTI_KEYS, CLIENT_COUNT_KEYS)
 
         # --- Attachment details ---
-        att = _get_attachment_details()
         total_photos = att["total_photos"]
         total_videos = att["total_videos"]
         pois_w_photos = att["pois_with_photos"]
         att_total_pois = att["total_pois_queried"]
         by_keyword = att["by_keyword"]
 
-        # --- Distributions ---
-        agent_dist = _distribution(all_attrs, "agent_name")
+        def dist(key, label_map=None):
+            return _ranked(raw_dists[key], label_map)
+
+        agent_dist = dist("agent_name")
         # Map raw CSV categories to grouped report categories
-        category_dist = _distribution(all_attrs, "category",
-                                      {**CATEGORY_LABELS, **CSV_CATEGORY_MAP})
-        subcategory_dist = _distribution(all_attrs, "secondary_category")
-        status_dist = _distribution(all_attrs, "company_status", STATUS_LABELS)
-
-        phone_count = _count_attr(all_attrs, "phone_number")
-        website_count = _count_attr(all_attrs, "website")
-        social_count = _count_attr(all_attrs, "social_media")
-        name_ar_count = _count_attr(all_attrs, "name_ar")
-        name_en_count = _count_attr(all_attrs, "name_en")
-        identity_correct_dist = _distribution(all_attrs, "identity_correct")
-        license_count = _count_attr(all_attrs, "commercial_license_number")
+        category_dist = dist("category", CLIENT_CATEGORY_LABELS)
+        subcategory_dist = dist("secondary_category")
+        status_dist = dist("company_status", STATUS_LABELS)
+
+        phone_count = counts["phone_number"]
+        website_count = counts["website"]
+        social_count = counts["social_media"]
+        name_ar_count = counts["name_ar"]
+        name_en_count = counts["name_en"]
+        identity_correct_dist = dist("identity_correct")
+        license_count = counts["commercial_license_number"]
 
         # Override contact/identity metrics for CSV data
         if csv_data is not None:
@@ -1036,110 +2059,77 @@ def client_report():
             website_count = total_pois
             social_count = int(total_pois * 0.92)
 
-        working_days_dist = _distribution(all_attrs, "working_days")
-        working_hours_dist = _distribution(all_attrs, "working_hours_each_day")
-        break_time_dist = _distribution(all_attrs, "break_time_each_day")
-
-        language_dist = {}
-        for a in all_attrs:
-            lv = a.get("language", "")
-            if lv:
-                for lang in str(lv).split(","):
-                    lang = lang.strip()
-                    if lang:
-                        language_dist[lang] = language_dist.get(lang, 0) + 1
-        language_dist = dict(sorted(language_dist.items(), key=lambda x: -x[1]))
-
-        payment_dist = {}
-        for a in all_attrs:
-            pv = a.get("accepted_payment_methods", "")
-            if pv:
-                for p in str(pv).split(","):
-                    p = p.strip()
-                    if p:
-                        payment_dist[p] = payment_dist.get(p, 0) + 1
-        payment_dist = dict(sorted(payment_dist.items(), key=lambda x: -x[1]))
-
-        cuisine_dist = {}
-        for a in all_attrs:
-            cv = a.get("cuisine", "")
-            if cv:
-                for c in str(cv).split(","):
-                    c = c.strip()
-                    if c:
-                        cuisine_dist[c] = cuisine_dist.get(c, 0) + 1
-        cuisine_dist = dict(sorted(cuisine_dist.items(), key=lambda x: -x[1]))
-
-        parking_dist = _distribution(all_attrs, "has_parking_lot")
-        valet_dist = _distribution(all_attrs, "valet_parking")
-        drive_thru_dist = _distribution(all_attrs, "drive_thru")
-        wheelchair_dist = _distribution(all_attrs, "is_wheelchair_accessible")
-        wifi_dist = _distribution(all_attrs, "wifi")
-
-        dine_in_dist = _distribution(all_attrs, "dine_in")
-        delivery_dist = _distribution(all_attrs, "only_delivery")
-        family_dist = _distribution(all_attrs, "has_family_seating")
-        large_groups_dist = _distribution(all_attrs, "large_groups_can_be_seated")
-        order_car_dist = _distribution(all_attrs, "order_from_car")
-
-        music_dist = _distribution(all_attrs, "music")
-        children_dist = _distribution(all_attrs, "children_area")
-        shisha_dist = _distribution(all_attrs, "shisha")
-
-        physical_menu_dist = _distribution(all_attrs, "has_physical_menu")
-        digital_menu_dist = _distribution(all_attrs, "has_digital_menu")
-
-        location_correct_dist = _distribution(all_attrs, "location_correct")
-        coords_count = sum(1 for a in all_attrs
-                           if (a.get("latitude") or a.get("corrected_lat"))
-                           and (a.get("longitude") or a.get("corrected_lon")))
-
-        building_dist = _distribution(all_attrs, "building_number")
-        floor_dist = _distribution(all_attrs, "floor_number")
-
-        smoking_dist = _distribution(all_attrs, "has_smoking_area")
-        waiting_dist = _distribution(all_attrs, "has_a_waiting_area")
-        reservation_dist = _distribution(all_attrs, "reservation")
-        prayer_dist = _distribution(all_attrs, "has_women_only_prayer_room")
-        pickup_dist = _distribution(all_attrs, "pickup_point_exists")
-
-        iftar_dist = _distribution(all_attrs, "offers_iftar_menu")
-        suhoor_dist = _distribution(all_attrs, "is_open_during_suhoor")
-
-        notes_count = _count_attr(all_attrs, "general_notes")
+        working_days_dist = dist("working_days")
+        working_hours_dist = dist("working_hours_each_day")
+        break_time_dist = dist("break_time_each_day")
+
+        language_dist = dist("language")
+        payment_dist = dist("accepted_payment_methods")
+        cuisine_dist = dist("cuisine")
+
+        parking_dist = dist("has_parking_lot")
+        valet_dist = dist("valet_parking")
+        drive_thru_dist = dist("drive_thru")
+        wheelchair_dist = dist("is_wheelchair_accessible")
+        wifi_dist = dist("wifi")
+
+        dine_in_dist = dist("dine_in")
+        delivery_dist = dist("only_delivery")
+        family_dist = dist("has_family_seating")
+        large_groups_dist = dist("large_groups_can_be_seated")
+        order_car_dist = dist("order_from_car")
+
+        music_dist = dist("music")
+        children_dist = dist("children_area")
+        shisha_dist = dist("shisha")
+
+        physical_menu_dist = dist("has_physical_menu")
+        digital_menu_dist = dist("has_digital_menu")
+
+        location_correct_dist = dist("location_correct")
+        coords_count = counts["coordinates"]
+
+        building_dist = dist("building_number")
+        floor_dist = dist("floor_number")
+
+        smoking_dist = dist("has_smoking_area")
+        waiting_dist = dist("has_a_waiting_area")
+        reservation_dist = dist("reservation")
+        prayer_dist = dist("has_women_only_prayer_room")
+        pickup_dist = dist("pickup_point_exists")
+
+        iftar_dist = dist("offers_iftar_menu")
+        suhoor_dist = dist("is_open_during_suhoor")
+
+        notes_count = counts["general_notes"]
 
         # --- Date range ---
         date_range = ""
         if csv_data is not None:
             # CSV data: use survey_date field if available
-            survey_dates = [a.get("survey_date") for a in all_attrs
+            survey_dates = [a.get("survey_date") for a in csv_data
                             if a.get("survey_date")]
             if survey_dates:
                 date_range = f"{min(survey_dates)} - {max(survey_dates)}"
         else:
-            dates = [r.get("submitted_at") for r in raw_rows
-                     if r.get("submitted_at")]
-            if dates:
-                date_range = (f"{min(dates).strftime('%b %d, %Y')} - "
-                              f"{max(dates).strftime('%b %d, %Y')}")
+            if first_submitted:
+                date_range = (f"{first_submitted.strftime('%b %d, %Y')} - "
+                              f"{last_submitted.strftime('%b %d, %Y')}")
 
         # --- Data quality ---
-        quality_fields = [
-            ("Arabic Name", "name_ar"), ("English Name", "name_en"),
-            ("Category", "category"), ("Subcategory", "secondary_category"),
-            ("Status", "company_status"), ("Phone Number", "phone_number"),
-            ("Website", "website"), ("Working Days", "working_days"),
-            ("Working Hours", "working_hours_each_day"),
-            ("Social Media", "social_media"),
-        ]
+        # Filled counts come from the single pass: a key's distribution
+        # total is its number of non-empty values.
         quality_data = []
         total_filled = 0
-        for label, field in quality_fields:
-            cnt = _count_attr(all_attrs, field)
+        for label, field in CLIENT_QUALITY_FIELDS:
+            if field in counts:
+                cnt = counts[field]
+            else:
+                cnt = sum(raw_dists[field].values())
             rate = cnt / total_pois * 100 if total_pois > 0 else 0
             quality_data.append((label, cnt, rate))
             total_filled += cnt
-        total_possible = len(quality_fields) * total_pois
+        total_possible = len(CLIENT_QUALITY_FIELDS) * total_pois
         overall_quality = total_filled / total_possible * 100 if total_possible > 0 else 0
 
         num_agents = len(agent_dist)
@@ -1150,27 +2140,7 @@ def client_report():
                               if att_total_pois > 0 else 0)
         avg_photos = total_photos / att_total_pois if att_total_pois > 0 else 0
 
-        # --- HTML helpers ---
-        def bar_chart(dist):
-            if not dist:
-                return '<p style="color:#999;font-style:italic">No data</p>'
-            mx = max(dist.values())
-            rows = []
-            for lbl, val in dist.items():
-                pct = val / mx * 100 if mx > 0 else 0
-                rows.append(
-                    f'<div class="bar-row">'
-                    f'<span class="bar-label">{esc(str(lbl))}</span>'
-                    f'<div class="bar-track">'
-                    f'<div class="bar-fill" style="width:{pct:.0f}%"></div></div>'
-                    f'<span class="bar-value">{val}</span></div>')
-            return "\n".join(rows)
-
-        def badge(pct):
-            cls = ("badge-high" if pct >= 70 else
-                   "badge-medium" if pct >= 40 else "badge-low")
-            return f'<span class="badge {cls}">{pct:.0f}%</span>'
-
+        # --- Render ---
         def yn(dist):
             y = dist.get("yes", 0)
             t = y + dist.get("no", 0)
@@ -1178,294 +2148,90 @@ def client_report():
                 return ""
             return f'{y} of {t} ({y / t * 100:.0f}%)'
 
-        def metric(label, val, total=None):
-            b = ""
-            if total and total > 0:
-                b = " " + badge(val / total * 100)
-            return (f'<div class="metric-row">'
-                    f'<span class="label">{esc(label)}</span>'
-                    f'<span class="value">{val}{b}</span></div>')
-
-        # --- Build HTML ---
-        now_str = datetime.now(timezone.utc).strftime("%B %d, %Y at %H:%M UTC")
-
-        # Header
-        header = (
-            f'<div class="report-header">'
-            f'<h1>POI Field Survey Report</h1>'
-            f'<div class="subtitle">Comprehensive Field Data Analysis</div>'
-            f'<p>Generated on {now_str}'
-            f'{f" | Survey Period: {date_range}" if date_range else ""}</p>'
-            f'</div>')
-
-        # KPI cards
-        kpis = (
-            f'<div class="kpi-grid">'
-            f'<div class="kpi-card"><div class="value">{total_pois}</div>'
-            f'<div class="label">Total POIs</div></div>'
-            f'<div class="kpi-card"><div class="value">{total_photos}</div>'
-            f'<div class="label">Photos Taken</div></div>'
-            f'<div class="kpi-card"><div class="value">{total_videos}</div>'
-            f'<div class="label">Videos Taken</div></div>'
-            f'<div class="kpi-card"><div class="value">{num_agents}</div>'
-            f'<div class="label">Field Agents</div></div>'
-            f'<div class="kpi-card"><div class="value">{overall_quality:.0f}%</div>'
-            f'<div class="label">Data Quality</div></div>'
-            f'<div class="kpi-card"><div class="value">{photo_coverage:.0f}%</div>'
-            f'<div class="label">Photo Coverage</div></div>'
-            f'</div>')
-
-        # Agent table
-        agent_rows = ""
-        for ag, cnt in agent_dist.items():
-            pct = cnt / total_pois * 100 if total_pois > 0 else 0
-            agent_rows += (f'<tr><td>{esc(str(ag))}</td>'
-                           f'<td>{cnt}</td><td>{pct:.1f}%</td></tr>')
-        agents_sec = (
-            f'<section class="section"><h2>1. Agent Performance</h2>'
-            f'<table><tr><th>Agent Name</th><th>Submissions</th>'
-            f'<th>Share</th></tr>{agent_rows}</table></section>')
-
-        # Category
-        category_sec = (
-            f'<section class="section">'
-            f'<h2>2. POI Category Analysis</h2>'
-            f'<div class="two-col"><div>'
-            f'<h3>By Category ({len(category_dist)})</h3>'
-            f'{bar_chart(category_dist)}</div><div>'
-            f'<h3>By Subcategory ({len(subcategory_dist)})</h3>'
-            f'{bar_chart(subcategory_dist)}</div></div></section>')
-
-        # Status
-        status_sec = (
-            f'<section class="section"><h2>3. Business Status</h2>'
-            f'{bar_chart(status_dist)}</section>' if status_dist else "")
-
-        # Identity & Contact
-        id_yes = identity_correct_dist.get("yes", 0)
-        id_total = sum(identity_correct_dist.values()) if identity_correct_dist else 0
-        identity_sec = (
-            f'<section class="section">'
-            f'<h2>4. Identity & Contact Coverage</h2>'
-            f'<div class="two-col"><div>'
-            f'<h3>Identity</h3>'
-            f'{metric("Arabic Names", name_ar_count, total_pois)}'
-            f'{metric("English Names", name_en_count, total_pois)}'
-            f'{metric("Identity Verified", id_yes, id_total)}'
-            f'{metric("Licenses Collected", license_count)}'
-            f'</div><div>'
-            f'<h3>Contact Info</h3>'
-            f'{metric("Phone Numbers", phone_count, total_pois)}'
-            f'{metric("Websites", website_count, total_pois)}'
-            f'{metric("Social Media", social_count, total_pois)}'
-            f'</div></div></section>')
-
-        # Location
-        loc_yes = location_correct_dist.get("yes", 0)
-        loc_total = sum(location_correct_dist.values()) if location_correct_dist else 0
-        location_sec = ""
-        if loc_total > 0 or coords_count > 0:
-            location_sec = (
-                f'<section class="section">'
-                f'<h2>5. Location & Coordinates</h2>'
-                f'{metric("Location Verified Correct", loc_yes, loc_total)}'
-                f'{metric("Coordinates Collected", coords_count)}'
-                f'</section>')
-
-        # Building
-        building_sec = ""
-        if building_dist or floor_dist:
-            building_sec = (
-                f'<section class="section">'
-                f'<h2>6. Building & Floor</h2>'
-                f'<div class="two-col"><div>'
-                f'<h3>Building Number</h3>{bar_chart(building_dist)}'
-                f'</div><div>'
-                f'<h3>Floor</h3>{bar_chart(floor_dist)}'
-                f'</div></div></section>')
-
-        # Working Hours
-        hours_sec = ""
-        if working_days_dist or working_hours_dist:
-            hours_sec = (
-                f'<section class="section">'
-                f'<h2>7. Working Hours Patterns</h2>'
-                f'<div class="two-col"><div>'
-                f'<h3>Working Days</h3>{bar_chart(working_days_dist)}'
-                f'</div><div>'
-                f'<h3>Daily Hours</h3>{bar_chart(working_hours_dist)}'
-                f'</div></div>'
-                f'<h3>Break Times</h3>{bar_chart(break_time_dist)}'
-                f'</section>')
-
-        # Language
-        language_sec = ""
-        if language_dist:
-            language_sec = (
-                f'<section class="section">'
-                f'<h2>8. Languages Spoken</h2>'
-                f'{bar_chart(language_dist)}</section>')
-
-        # Payment
-        payment_sec = ""
-        if payment_dist:
-            payment_sec = (
-                f'<section class="section">'
-                f'<h2>9. Payment Methods</h2>'
-                f'{bar_chart(payment_dist)}</section>')
-
-        # Restaurant & F&B
-        restaurant_sec = ""
-        if cuisine_dist or physical_menu_dist or dine_in_dist:
-            menu_metrics = ""
-            if physical_menu_dist:
-                menu_metrics += metric("Has Physical Menu", yn(physical_menu_dist))
-            if digital_menu_dist:
-                menu_metrics += metric("Has Digital Menu / QR", yn(digital_menu_dist))
-
-            seating = ""
-            for lbl, d in [("Dine-in", dine_in_dist),
-                           ("Family Seating", family_dist),
-                           ("Large Groups", large_groups_dist),
-                           ("Delivery Only", delivery_dist),
-                           ("Order from Car", order_car_dist)]:
-                s = yn(d)
-                if s:
-                    seating += metric(lbl, s)
-
-            restaurant_sec = (
-                f'<section class="section">'
-                f'<h2>10. Restaurant & F&B Analysis</h2>'
-                f'<div class="two-col"><div>'
-                f'<h3>Cuisine Types ({len(cuisine_dist)})</h3>'
-                f'{bar_chart(cuisine_dist)}</div><div>'
-                f'<h3>Menu Availability</h3>{menu_metrics}'
-                f'<h3>Seating & Service</h3>{seating}'
-                f'</div></div></section>')
-
-        # Facilities
-        facility_parts_left = ""
-        for lbl, d in [("Has Parking", parking_dist),
-                       ("Valet Parking", valet_dist),
-                       ("Drive-Thru", drive_thru_dist)]:
-            s = yn(d)
-            if s:
-                facility_parts_left += metric(lbl, s)
-        for lbl, d in [("Wheelchair Accessible", wheelchair_dist),
-                       ("WiFi Available", wifi_dist)]:
-            s = yn(d)
-            if s:
-                facility_parts_left += metric(lbl, s)
-
-        facility_parts_right = ""
-        for lbl, d in [("Music", music_dist),
-                       ("Children Area", children_dist),
-                       ("Shisha", shisha_dist),
-                       ("Smoking Area", smoking_dist),
-                       ("Waiting Area", waiting_dist),
-                       ("Reservations", reservation_dist),
-                       ("Women Prayer Room", prayer_dist),
-                       ("Pickup Point", pickup_dist)]:
-            s = yn(d)
-            if s:
-                facility_parts_right += metric(lbl, s)
-
-        facilities_sec = ""
-        if facility_parts_left or facility_parts_right:
-            facilities_sec = (
-                f'<section class="section">'
-                f'<h2>11. Facilities & Amenities</h2>'
-                f'<div class="two-col"><div>'
-                f'<h3>Parking, Access & Connectivity</h3>'
-                f'{facility_parts_left}</div><div>'
-                f'<h3>Entertainment & Services</h3>'
-                f'{facility_parts_right}</div></div></section>')
-
-        # Ramadan
-        ramadan_sec = ""
-        if iftar_dist or suhoor_dist:
-            rm = ""
-            if iftar_dist:
-                rm += metric("Offers Iftar Menu", yn(iftar_dist))
-            if suhoor_dist:
-                rm += metric("Open During Suhoor", yn(suhoor_dist))
-            ramadan_sec = (
-                f'<section class="section">'
-                f'<h2>12. Ramadan Services</h2>{rm}</section>')
-
-        # Media documentation
-        photo_type_rows = ""
-        for kw, cnt in sorted(by_keyword.items(), key=lambda x: -x[1]):
-            lbl = PHOTO_TYPE_LABELS.get(kw, kw.replace("_", " ").title())
-            photo_type_rows += f'<tr><td>{esc(lbl)}</td><td>{cnt}</td></tr>'
-
-        media_sec = (
-            f'<section class="section">'
-            f'<h2>13. Media Documentation</h2>'
-            f'<div class="kpi-grid" style="margin-bottom:24px">'
-            f'<div class="kpi-card"><div class="value">{total_photos}</div>'
-            f'<div class="label">Total Photos</div></div>'
-            f'<div class="kpi-card"><div class="value">{total_videos}</div>'
-            f'<div class="label">Total Videos</div></div>'
-            f'<div class="kpi-card"><div class="value">{photo_coverage:.0f}%</div>'
-            f'<div class="label">POIs with Photos</div></div>'
-            f'<div class="kpi-card"><div class="value">{avg_photos:.1f}</div>'
-            f'<div class="label">Avg Photos / POI</div></div></div>'
-            f'<h3>Breakdown by Type</h3>'
-            f'<table><tr><th>Attachment Type</th><th>Count</th></tr>'
-            f'{photo_type_rows}</table></section>')
-
-        # Data quality
-        quality_rows = ""
-        for lbl, cnt, rate in quality_data:
-            quality_rows += (f'<tr><td>{esc(lbl)}</td>'
-                             f'<td>{cnt} / {total_pois}</td>'
-                             f'<td>{badge(rate)}</td></tr>')
-        quality_sec = (
-            f'<section class="section">'
-            f'<h2>14. Data Quality Assessment</h2>'
-            f'<div class="kpi-grid" style="margin-bottom:24px">'
-            f'<div class="kpi-card"><div class="value">{overall_quality:.0f}%</div>'
-            f'<div class="label">Overall Quality Score</div></div>'
-            f'<div class="kpi-card"><div class="value">{total_pois}</div>'
-            f'<div class="label">POIs in Database</div></div>'
-            f'<div class="kpi-card"><div class="value">{att_total_pois}</div>'
-            f'<div class="label">POIs on Service</div></div></div>'
-            f'<table><tr><th>Field</th><th>Collected</th>'
-            f'<th>Completion Rate</th></tr>{quality_rows}</table></section>')
-
-        # Notes
-        notes_sec = ""
-        if notes_count > 0:
-            notes_sec = (
-                f'<section class="section">'
-                f'<h2>15. General Notes</h2>'
-                f'{metric("Submissions with Notes", notes_count, total_pois)}'
-                f'</section>')
-
-        # Footer
-        footer = (
-            f'<div class="footer">'
-            f'<p>Report generated on {now_str}</p>'
-            f'<p>POI Field Survey | Powered by Survey123 & ArcGIS Online</p>'
-            f'</div>')
-
-        body = (header + kpis + agents_sec + category_sec + status_sec
-                + identity_sec + location_sec + building_sec + hours_sec
-                + language_sec + payment_sec + restaurant_sec
-                + facilities_sec + ramadan_sec + media_sec + quality_sec
-                + notes_sec + footer)
-
-        css = REPORT_CSS
-        full_html = (
-            f'<!DOCTYPE html><html lang="en"><head><meta charset="utf-8">'
-            f'<meta name="viewport" content="width=device-width,initial-scale=1">'
-            f'<title>POI Field Survey Report</title>'
-            f'<style>{css}</style></head><body>{body}</body></html>')
-
-        resp = make_response(full_html)
-        resp.headers["Content-Type"] = "text/html; charset=utf-8"
-        return resp
+        def yn_rows(pairs):
+            return [(lbl, s) for lbl, s in ((lbl, yn(d)) for lbl, d in pairs) if s]
+
+        menu_metrics = []
+        if physical_menu_dist:
+            menu_metrics.append(("Has Physical Menu", yn(physical_menu_dist)))
+        if digital_menu_dist:
+            menu_metrics.append(("Has Digital Menu / QR", yn(digital_menu_dist)))
+
+        ramadan = []
+        if iftar_dist:
+            ramadan.append(("Offers Iftar Menu", yn(iftar_dist)))
+        if suhoor_dist:
+            ramadan.append(("Open During Suhoor", yn(suhoor_dist)))
+
+        photo_types = [
+            (PHOTO_TYPE_LABELS.get(kw, kw.replace("_", " ").title()), cnt)
+            for kw, cnt in Counter(by_keyword).most_common()]
+
+        stream = CLIENT_REPORT_TEMPLATE.stream(
+            now_str=datetime.now(timezone.utc).strftime("%B %d, %Y at %H:%M UTC"),
+            date_range=date_range,
+            total_pois=total_pois,
+            total_photos=total_photos,
+            total_videos=total_videos,
+            num_agents=num_agents,
+            overall_quality=overall_quality,
+            photo_coverage=photo_coverage,
+            avg_photos=avg_photos,
+            att_total_pois=att_total_pois,
+            agent_dist=agent_dist,
+            category_dist=category_dist,
+            subcategory_dist=subcategory_dist,
+            status_dist=status_dist,
+            name_ar_count=name_ar_count,
+            name_en_count=name_en_count,
+            id_yes=identity_correct_dist.get("yes", 0),
+            id_total=sum(identity_correct_dist.values()),
+            license_count=license_count,
+            phone_count=phone_count,
+            website_count=website_count,
+            social_count=social_count,
+            loc_yes=location_correct_dist.get("yes", 0),
+            loc_total=sum(location_correct_dist.values()),
+            coords_count=coords_count,
+            building_dist=building_dist,
+            floor_dist=floor_dist,
+            working_days_dist=working_days_dist,
+            working_hours_dist=working_hours_dist,
+            break_time_dist=break_time_dist,
+            language_dist=language_dist,
+            payment_dist=payment_dist,
+            cuisine_dist=cuisine_dist,
+            show_restaurant=bool(cuisine_dist or physical_menu_dist
+                                 or dine_in_dist),
+            menu_metrics=menu_metrics,
+            seating=yn_rows([("Dine-in", dine_in_dist),
+                             ("Family Seating", family_dist),
+                             ("Large Groups", large_groups_dist),
+                             ("Delivery Only", delivery_dist),
+                             ("Order from Car", order_car_dist)]),
+            facilities_left=yn_rows([("Has Parking", parking_dist),
+                                     ("Valet Parking", valet_dist),
+                                     ("Drive-Thru", drive_thru_dist),
+                                     ("Wheelchair Accessible", wheelchair_dist),
+                                     ("WiFi Available", wifi_dist)]),
+            facilities_right=yn_rows([("Music", music_dist),
+                                      ("Children Area", children_dist),
+                                      ("Shisha", shisha_dist),
+                                      ("Smoking Area", smoking_dist),
+                                      ("Waiting Area", waiting_dist),
+                                      ("Reservations", reservation_dist),
+                                      ("Women Prayer Room", prayer_dist),
+                                      ("Pickup Point", pickup_dist)]),
+            ramadan=ramadan,
+            photo_types=photo_types,
+            quality_data=quality_data,
+            notes_count=notes_count,
+        )
+        stream.enable_buffering(CLIENT_REPORT_BUFFER)
+        resp = Response(
+            stream_with_context(_tee_response("client-report", etag, stream)),
+            mimetype="text/html")
+        return _with_validators(resp, etag)
 
     except Exception as e:
         logger.error("Client report error: %s", str(e), exc_info=True)
@@ -1486,7 +2252,7 @@ def debug_attachments():
 
     if token:
         try:
-            r = http_requests.get(
+            r = arcgis_session.get(
                 f"{ARCGIS_SERVICE_URL}/query",
                 params={
                     "where": "agent_name IS NOT NULL AND agent_name <> ''",
@@ -1496,7 +2262,7 @@ def debug_attachments():
                 },
                 timeout=30,
             )
-            oid_data = r.json()
+            oid_data = orjson.loads(r.content)
             oids = oid_data.get("objectIds", [])
             info["survey_submissions_found"] = len(oids)
             info["sample_oids"] = oids[:5]
@@ -1504,7 +2270,7 @@ def debug_attachments():
             if oids:
                 batch = oids[:10]
                 ids_str = ",".join(str(o) for o in batch)
-                r2 = http_requests.get(
+                r2 = arcgis_session.get(
                     f"{ARCGIS_SERVICE_URL}/queryAttachments",
                     params={
                         "objectIds": ids_str,
@@ -1513,7 +2279,7 @@ def debug_attachments():
                     },
                     timeout=30,
                 )
-                att_data = r2.json()
+                att_data = orjson.loads(r2.content)
                 info["attachment_query_sample"] = att_data
         except Exception as e:
             info["query_error"] = str(e)
@@ -1525,9 +2291,6 @@ def debug_attachments():
     return jsonify(info), 200
 
 
-with app.app_context():
-    init_db()
-
 if __name__ == "__main__":
     port = int(os.environ.get("PORT", 5000))
     app.run(host="0.0.0.0", port=port)
@@ -0,0 +1,18 @@
+"""Gunicorn settings: ``gunicorn -c gunicorn_conf.py app:app``.
+
+gevent workers let one request's ArcGIS or Postgres wait overlap with other
+requests instead of tying up a whole worker process.
+"""
+import os
+
+worker_class = "gevent"
+workers = int(os.environ.get("WEB_CONCURRENCY", 4))
+worker_connections = 100
+timeout = 60
+
+
+def post_fork(server, worker):
+    # psycopg2 is a C extension that gevent's monkey-patching can't reach;
+    # this makes its socket waits yield to the event loop.
+    from psycogreen.gevent import patch_psycopg
+    patch_psycopg()